@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from compositor import grid_shape, fit_frame_into, render_grid
+from overlay_cache import OverlayCache
+
+"""
+拼接合成效能測試
+以合成的 1080p 影格與標籤多邊形，比較逐一繪製與執行緒池並行繪製 cell 的耗時，
+分別在 OpenCV 預設內部執行緒數（與應用程式相同）與單執行緒下量測。
+用法: python benchmark_composite.py --cameras 4 16 --iterations 50
+"""
+
+STYLE = {
+    "car": (True, (0, 255, 0)),
+    "parking": (True, (255, 255, 0)),
+    "plate": (True, (0, 255, 255)),
+}
+
+
+def make_label_file(directory, polygons, seed):
+    """建立含有隨機多邊形的標籤 JSON"""
+    rng = np.random.default_rng(seed)
+    labels = []
+    for i in range(polygons):
+        cx, cy = rng.uniform(0.1, 0.9, size=2)
+        pts = [
+            [float(cx + dx), float(cy + dy)]
+            for dx, dy in rng.uniform(-0.05, 0.05, size=(4, 2))
+        ]
+        labels.append(
+            {"label_type": ["car", "parking", "plate"][i % 3], "points_normalized": pts}
+        )
+    path = os.path.join(directory, f"label_{seed}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"labels": labels}, f)
+    return path
+
+
+def run_case(cameras, iterations, workers, source_size, output_size, polygons):
+    """回傳 (逐一繪製毫秒中位數, 並行繪製毫秒中位數)"""
+    rng = np.random.default_rng(0)
+    src_w, src_h = source_size
+    frames = {
+        cam_id: rng.integers(0, 255, (src_h, src_w, 3), dtype=np.uint8)
+        for cam_id in range(1, cameras + 1)
+    }
+    cam_ids = sorted(frames)
+    cols, rows = grid_shape(cameras)
+    out_w, out_h = output_size
+
+    with tempfile.TemporaryDirectory() as tmp:
+        label_paths = {
+            cam_id: make_label_file(tmp, polygons, cam_id) for cam_id in cam_ids
+        }
+        cache = OverlayCache()
+
+        def render_cell(cam_id, cell):
+            fit_frame_into(frames[cam_id], cell)
+            h, w = cell.shape[:2]
+            cache.get_layer(cam_id, label_paths[cam_id], w, h, STYLE).apply(cell)
+
+        def measure(executor):
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                collage = np.zeros((out_h, out_w, 3), dtype=np.uint8)
+                render_grid(collage, cam_ids, cols, render_cell, executor)
+                timings.append((time.perf_counter() - start) * 1000)
+            return statistics.median(timings)
+
+        measure(None)  # 預先建立圖層快取
+        serial = measure(None)
+        with ThreadPoolExecutor(max_workers=min(workers, cameras)) as executor:
+            parallel = measure(executor)
+    return serial, parallel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="拼接合成效能測試")
+    parser.add_argument("--cameras", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--polygons", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"workers={args.workers}, polygons/camera={args.polygons}")
+    # 應用程式使用 OpenCV 預設的內部執行緒數；另以單執行緒 OpenCV 對照，
+    # 觀察執行緒池疊加在 OpenCV 內部執行緒之上的影響
+    for opencv_threads in dict.fromkeys((cv2.getNumThreads(), 1)):
+        cv2.setNumThreads(opencv_threads)
+        print(f"OpenCV threads={cv2.getNumThreads()}")
+        print(f"{'cameras':>8} {'serial ms':>10} {'parallel ms':>12} {'speedup':>8}")
+        for cameras in args.cameras:
+            serial, parallel = run_case(
+                cameras,
+                args.iterations,
+                args.workers,
+                source_size=(1920, 1080),
+                output_size=(1920, 1080),
+                polygons=args.polygons,
+            )
+            print(
+                f"{cameras:>8} {serial:>10.2f} {parallel:>12.2f} "
+                f"{serial / parallel:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import math
+import cv2
+
+"""
+拼接合成模組
+將多台攝影機的畫面排入格狀拼接畫布。每個 cell 是畫布上互不重疊的切片，
+cv2.resize 與 NumPy 複製在執行時會釋放 GIL，因此各 cell 可交給執行緒池並行繪製。
+此模組不依賴 Qt，可單獨用於效能測試。
+"""
+
+
+def grid_shape(count):
+    """依攝影機數量計算 (cols, rows)，4 台為 2×2、16 台為 4×4"""
+    cols = max(1, math.ceil(math.sqrt(count)))
+    rows = max(1, math.ceil(count / cols))
+    return cols, rows
+
+
+def fit_geometry(w, h, cell_w, cell_h):
+    """計算等比例縮放後的尺寸與置中偏移 (new_w, new_h, off_x, off_y)"""
+    scale = min(cell_w / w, cell_h / h)
+    new_w = int(w * scale)
+    new_h = int(h * scale)
+    off_x = (cell_w - new_w) // 2
+    off_y = (cell_h - new_h) // 2
+    return new_w, new_h, off_x, off_y
+
+
+def fit_frame_into(frame_bgr, cell, interpolation=cv2.INTER_LINEAR):
+    """
+    等比例縮放影像並直接寫入 cell 切片（黑邊保持原值），
+    回傳畫面區域的幾何資訊 (new_w, new_h, off_x, off_y)。
+    """
+    h, w = frame_bgr.shape[:2]
+    cell_h, cell_w = cell.shape[:2]
+    geometry = fit_geometry(w, h, cell_w, cell_h)
+    new_w, new_h, off_x, off_y = geometry
+    target = cell[off_y : off_y + new_h, off_x : off_x + new_w]
+    cv2.resize(frame_bgr, (new_w, new_h), dst=target, interpolation=interpolation)
+    return geometry
+
+
+def render_grid(collage, cam_ids, cols, render_cell, executor=None):
+    """
+    將每台攝影機繪製到拼接畫布上對應的 cell。
+    render_cell(cam_id, cell) 負責就地繪製 cell 切片；
+    提供 executor 時各 cell 並行繪製，並等待全部完成。
+    """
+    rows = math.ceil(len(cam_ids) / cols)
+    cell_h = collage.shape[0] // rows
+    cell_w = collage.shape[1] // cols
+
+    jobs = []
+    for i, cam_id in enumerate(cam_ids):
+        r, c = divmod(i, cols)
+        y0, x0 = r * cell_h, c * cell_w
+        jobs.append((cam_id, collage[y0 : y0 + cell_h, x0 : x0 + cell_w]))
+
+    if executor is None or len(jobs) <= 1:
+        for cam_id, cell in jobs:
+            render_cell(cam_id, cell)
+        return collage
+
+    futures = [executor.submit(render_cell, cam_id, cell) for cam_id, cell in jobs]
+    for future in futures:
+        future.result()  # 傳遞工作執行緒中的例外
+    return collage
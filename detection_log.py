@@ -0,0 +1,259 @@
+import os
+import json
+import queue
+import threading
+import time
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+"""
+檢測紀錄模組
+DetectionLog 以僅追加 (append-only) 的欄位式儲存保存檢測結果：
+每個區段 (segment) 是一個目錄，每個欄位一個 NumPy memmap 檔 (.npy)。
+index.json 記錄每個區段的筆數、時間範圍與攝影機集合，
+查詢時先以索引篩選區段，不需掃描全部資料。
+DetectionLogThread 在背景線程中批次寫入，避免阻塞檢測流程。
+"""
+
+# 欄位名稱 -> (dtype, 每列形狀)
+COLUMNS = {
+    "cam_id": (np.int16, ()),
+    "ts": (np.float64, ()),
+    "cls": (np.int16, ()),
+    "conf": (np.float32, ()),
+    "box": (np.float32, (4,)),  # 正規化座標 (x1, y1, x2, y2)
+}
+
+INDEX_FILE = "index.json"
+
+
+class DetectionLog:
+    """檢測紀錄儲存區，提供批次追加與依時間、攝影機查詢。"""
+
+    def __init__(self, root_dir="detections", segment_rows=65536, segment_seconds=3600):
+        self.root_dir = root_dir  # 儲存目錄
+        self.segment_rows = segment_rows  # 每個區段最多筆數
+        self.segment_seconds = segment_seconds  # 每個區段涵蓋的最長時間
+        self._lock = threading.Lock()
+        self._active = None  # 目前寫入中的區段 memmap
+        os.makedirs(self.root_dir, exist_ok=True)
+        self.segments = self._load_index()
+
+    # ============ 索引 ============
+    def _load_index(self):
+        path = os.path.join(self.root_dir, INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("segments", [])
+
+    def _save_index(self):
+        """以暫存檔替換的方式寫入索引，確保中斷時索引仍完整。"""
+        path = os.path.join(self.root_dir, INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"segments": self.segments}, f)
+        os.replace(tmp_path, path)
+
+    # ============ 寫入 ============
+    def _open_segment(self, meta, mode):
+        seg_dir = os.path.join(self.root_dir, meta["name"])
+        columns = {}
+        for name, (dtype, shape) in COLUMNS.items():
+            path = os.path.join(seg_dir, f"{name}.npy")
+            if mode == "w+":
+                columns[name] = np.lib.format.open_memmap(
+                    path, mode="w+", dtype=dtype, shape=(self.segment_rows,) + shape
+                )
+            else:
+                columns[name] = np.load(path, mmap_mode=mode)
+        return columns
+
+    def _new_segment(self, ts):
+        name = f"seg_{len(self.segments):06d}"
+        os.makedirs(os.path.join(self.root_dir, name), exist_ok=True)
+        meta = {
+            "name": name,
+            "rows": 0,
+            "capacity": self.segment_rows,
+            "ts_min": ts,
+            "ts_max": ts,
+            "cams": [],
+        }
+        self.segments.append(meta)
+        self._active = self._open_segment(meta, "w+")
+        return meta
+
+    def _writable_segment(self, ts):
+        """取得可寫入的區段；已滿或超過時間範圍時建立新區段。"""
+        meta = self.segments[-1] if self.segments else None
+        if meta is not None and (
+            meta["rows"] >= meta["capacity"]
+            or ts - meta["ts_min"] >= self.segment_seconds
+        ):
+            self._close_active()
+            meta = None
+        if meta is None:
+            return self._new_segment(ts)
+        if self._active is None:
+            self._active = self._open_segment(meta, "r+")  # 接續上次的區段
+        return meta
+
+    def _close_active(self):
+        if self._active is not None:
+            for column in self._active.values():
+                column.flush()
+            self._active = None
+
+    def append(self, columns):
+        """
+        追加一批資料。columns 為欄位名稱到陣列的字典，各欄位長度相同，
+        且 ts 大致依時間遞增。
+        """
+        total = len(columns["ts"])
+        if total == 0:
+            return
+        with self._lock:
+            start = 0
+            while start < total:
+                meta = self._writable_segment(float(columns["ts"][start]))
+                count = min(total - start, meta["capacity"] - meta["rows"])
+                row = meta["rows"]
+                for name in COLUMNS:
+                    self._active[name][row : row + count] = columns[name][
+                        start : start + count
+                    ]
+                ts = columns["ts"][start : start + count]
+                cams = np.unique(columns["cam_id"][start : start + count])
+                meta["rows"] = row + count
+                meta["ts_min"] = min(meta["ts_min"], float(ts.min()))
+                meta["ts_max"] = max(meta["ts_max"], float(ts.max()))
+                meta["cams"] = sorted(set(meta["cams"]) | set(int(c) for c in cams))
+                start += count
+            for column in self._active.values():
+                column.flush()
+            self._save_index()  # 先寫資料再更新索引
+
+    def close(self):
+        with self._lock:
+            self._close_active()
+
+    # ============ 查詢 ============
+    def query(self, ts_start, ts_end, cam_ids=None, classes=None, min_conf=None):
+        """
+        查詢時間範圍 [ts_start, ts_end] 內的檢測結果，回傳欄位字典。
+        僅讀取索引中時間範圍與攝影機集合相符的區段。
+        """
+        with self._lock:
+            candidates = [
+                dict(meta)
+                for meta in self.segments
+                if meta["rows"] > 0
+                and meta["ts_max"] >= ts_start
+                and meta["ts_min"] <= ts_end
+                and (cam_ids is None or set(meta["cams"]) & set(cam_ids))
+            ]
+
+        parts = {name: [] for name in COLUMNS}
+        for meta in candidates:
+            columns = self._open_segment(meta, "r")
+            rows = meta["rows"]
+            ts = columns["ts"][:rows]
+            mask = (ts >= ts_start) & (ts <= ts_end)
+            if cam_ids is not None:
+                mask &= np.isin(columns["cam_id"][:rows], list(cam_ids))
+            if classes is not None:
+                mask &= np.isin(columns["cls"][:rows], list(classes))
+            if min_conf is not None:
+                mask &= columns["conf"][:rows] >= min_conf
+            for name in COLUMNS:
+                parts[name].append(np.asarray(columns[name][:rows][mask]))
+
+        result = {}
+        for name, (dtype, shape) in COLUMNS.items():
+            if parts[name]:
+                result[name] = np.concatenate(parts[name])
+            else:
+                result[name] = np.empty((0,) + shape, dtype=dtype)
+        return result
+
+
+class DetectionLogThread(QThread):
+    """在背景線程中累積檢測結果並批次寫入 DetectionLog。"""
+
+    error_signal = pyqtSignal(str, int)  # (error_msg, cam_id)
+
+    def __init__(
+        self,
+        detection_log,
+        flush_rows=2048,
+        flush_interval=2.0,
+        max_pending=1024,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.detection_log = detection_log
+        self.flush_rows = flush_rows  # 累積多少筆後寫入
+        self.flush_interval = flush_interval  # 最長寫入間隔（秒）
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._running = True
+        self.dropped = 0  # 佇列已滿而捨棄的批次數
+
+    def submit(self, cam_id, ts, dets):
+        """
+        加入一批檢測結果（不阻塞）。
+        dets 形狀為 [N,6]：(x1, y1, x2, y2, conf, cls)，座標為正規化值。
+        """
+        if len(dets) == 0:
+            return
+        try:
+            self._queue.put_nowait((cam_id, ts, dets))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        """執行線程，定期將累積的檢測結果寫入儲存區。"""
+        pending = []
+        pending_rows = 0
+        last_flush = time.time()
+        while self._running or not self._queue.empty():
+            try:
+                item = self._queue.get(timeout=0.2)
+                pending.append(item)
+                pending_rows += len(item[2])
+            except queue.Empty:
+                pass
+            now = time.time()
+            if pending and (
+                pending_rows >= self.flush_rows
+                or now - last_flush >= self.flush_interval
+            ):
+                self._flush(pending)
+                pending = []
+                pending_rows = 0
+                last_flush = now
+        if pending:
+            self._flush(pending)
+        self.detection_log.close()
+
+    def _flush(self, batch):
+        try:
+            dets = np.concatenate(
+                [np.asarray(d, dtype=np.float32) for _, _, d in batch]
+            )
+            counts = [len(d) for _, _, d in batch]
+            columns = {
+                "cam_id": np.repeat([c for c, _, _ in batch], counts).astype(np.int16),
+                "ts": np.repeat([t for _, t, _ in batch], counts).astype(np.float64),
+                "cls": dets[:, 5].astype(np.int16),
+                "conf": dets[:, 4],
+                "box": dets[:, :4],
+            }
+            self.detection_log.append(columns)
+        except Exception as e:
+            self.error_signal.emit(f"寫入檢測紀錄失敗: {e}", int(batch[0][0]))
+
+    def stop(self):
+        """停止線程，寫完剩餘的檢測結果後結束。"""
+        self._running = False
+        self.wait()
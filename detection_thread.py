@@ -0,0 +1,261 @@
+import threading
+import time
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+from tiling import tile_windows, filter_windows, merge_boxes
+
+"""
+檢測線程類別
+此類別在獨立線程中執行 YOLO 檢測。每台攝影機只保留最新一張待檢測影格，
+影格以 FramePool 引用計數保留至檢測完成，因此積壓量有上限；
+min_interval 控制每台攝影機的最短檢測間隔。
+設定 priority_cam 時該攝影機優先檢測，其餘攝影機降為 background_interval。
+設定 tiling 時改用切片推論：所有待檢測攝影機的切片合併成批次送入模型，
+再以跨切片的框合併（IoS 門檻）去除重複檢測框。
+設定 plate_thread 時，車輛框連同檢測所用的影格送交車牌辨識。
+"""
+
+
+class DetectionThread(QThread):
+    detections_ready = pyqtSignal(object, int)  # (dets [N,6], cam_id)
+    tile_stats_ready = pyqtSignal(int, int, float)  # (cam_id, 切片數, 增加的毫秒數)
+
+    def __init__(
+        self,
+        detection_log_thread=None,
+        min_interval=0.0,
+        background_interval=5.0,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.detection_log_thread = detection_log_thread  # 檢測紀錄（可選）
+        self.min_interval = min_interval  # 每台攝影機的最短檢測間隔（秒）
+        self.background_interval = background_interval  # 非優先攝影機的檢測間隔
+        self.priority_cam = None  # 優先檢測的攝影機 ID
+        self.tiling = None  # 切片推論設定，None 表示整張影格推論
+        self.roi_regions = {}  # cam_id -> [正規化外接框]，供只處理標籤區域時使用
+        self.plate_thread = None  # 車牌辨識線程（可選），以檢測所用的影格裁切車輛
+        self.vehicle_classes = ("car",)  # 送交車牌辨識的類別名稱
+        self.model = None
+        self._cond = threading.Condition()
+        # cam_id -> (首次等待時間, frame, pool, 影格時間)，只保留最新影格
+        self._slots = {}
+        self._last_run = {}  # cam_id -> 上次檢測時間
+        self._running = True
+        self.inference_time = 0.0  # 推論耗時的指數移動平均（秒）
+
+    def set_model(self, model):
+        """設定或清除 YOLO 模型"""
+        with self._cond:
+            self.model = model
+            if model is None:
+                for _, frame, pool, _ in self._slots.values():
+                    self.release_frame(frame, pool)
+                self._slots.clear()
+
+    def submit(self, cam_id, frame, pool=None, ts=None):
+        """
+        加入待檢測影格；未達檢測間隔時直接捨棄。
+        pool 為影格所屬的 FramePool，檢測完成或被取代時釋放。
+        ts 為影格時間（預設為送出時間），檢測紀錄以此時間記錄。
+        """
+        now = time.time()
+        ts = now if ts is None else ts
+        with self._cond:
+            if self.model is None:
+                return
+            if now - self._last_run.get(cam_id, 0.0) < self.interval_for(cam_id):
+                return
+            # 以較新的影格取代，但保留最早的等待時間以反映積壓
+            first = now
+            if cam_id in self._slots:
+                first, old_frame, old_pool, _ = self._slots[cam_id]
+                self.release_frame(old_frame, old_pool)
+            if pool is not None:
+                pool.retain(frame)
+            self._slots[cam_id] = (first, frame, pool, ts)
+            self._cond.notify()
+
+    def interval_for(self, cam_id):
+        """攝影機的最短檢測間隔，有優先攝影機時其餘攝影機降頻"""
+        if self.priority_cam is not None and cam_id != self.priority_cam:
+            return max(self.min_interval, self.background_interval)
+        return self.min_interval
+
+    def backlog(self):
+        """回傳 (待檢測影格數, 最舊待檢測影格的等待秒數)"""
+        now = time.time()
+        with self._cond:
+            if not self._slots:
+                return 0, 0.0
+            oldest = min(slot[0] for slot in self._slots.values())
+            return len(self._slots), now - oldest
+
+    def next_jobs(self, limit):
+        """依優先攝影機、等待時間排序，取出最多 limit 張影格（需持有鎖）"""
+        order = sorted(
+            self._slots,
+            key=lambda c: (c != self.priority_cam, self._slots[c][0]),
+        )
+        jobs = []
+        for cam_id in order[:limit]:
+            _, frame, pool, ts = self._slots.pop(cam_id)
+            jobs.append((cam_id, frame, pool, ts))
+        return jobs
+
+    @staticmethod
+    def release_frame(frame, pool):
+        if pool is not None:
+            pool.release(frame)
+
+    def run(self):
+        """執行線程，依序檢測各攝影機的最新影格。"""
+        while self._running:
+            with self._cond:
+                while self._running and not self._slots:
+                    self._cond.wait(0.5)
+                if not self._running:
+                    break
+                model = self.model
+                tiling = self.tiling
+                # 切片模式一次處理所有待檢測攝影機，讓切片合併成批次
+                jobs = self.next_jobs(len(self._slots) if tiling else 1)
+                now = time.time()
+                for cam_id, _, _, _ in jobs:
+                    self._last_run[cam_id] = now
+
+            start = time.perf_counter()
+            try:
+                if model is None:
+                    continue
+                if tiling is not None:
+                    outputs = self.detect_tiled(model, jobs, tiling)
+                else:
+                    cam_id, frame, _, _ = jobs[0]
+                    outputs = [(cam_id, self.detect(model, frame), 0, 0.0)]
+                self.submit_vehicles(model, jobs, outputs)
+            except Exception as e:
+                print(f"Detection error: {e}")
+                continue
+            finally:
+                for _, frame, pool, _ in jobs:
+                    self.release_frame(frame, pool)
+            elapsed = time.perf_counter() - start
+            self.inference_time = 0.8 * self.inference_time + 0.2 * elapsed
+
+            frame_times = {cam_id: ts for cam_id, _, _, ts in jobs}
+            for cam_id, dets, tile_count, added_ms in outputs:
+                if self.detection_log_thread is not None:
+                    # 以影格時間記錄，而非推論完成時間
+                    self.detection_log_thread.submit(cam_id, frame_times[cam_id], dets)
+                self.detections_ready.emit(dets, cam_id)
+                if tiling is not None:
+                    self.tile_stats_ready.emit(cam_id, tile_count, added_ms)
+
+    def submit_vehicles(self, model, jobs, outputs):
+        """在影格釋放前，將車輛檢測框連同同一張影格送交車牌辨識線程"""
+        if self.plate_thread is None:
+            return
+        names = getattr(model, "names", {})
+        frames = {cam_id: frame for cam_id, frame, _, _ in jobs}
+        for cam_id, dets, _, _ in outputs:
+            car_boxes = [
+                tuple(float(v) for v in det[:4])
+                for det in dets
+                if names.get(int(det[5])) in self.vehicle_classes
+            ]
+            self.plate_thread.submit(cam_id, frames[cam_id], car_boxes)
+
+    def detect_tiled(self, model, jobs, tiling):
+        """
+        切片推論。回傳 [(cam_id, dets, 切片數, 切片增加的毫秒數), ...]，
+        dets 與 detect() 相同為正規化座標。
+        """
+        tile_size = tiling.get("tile_size", 640)
+        overlap = tiling.get("overlap", 0.2)
+        batch_size = tiling.get("batch_size", 16)
+        full_frame = tiling.get("full_frame", True)  # 另以整張影格推論大型物件
+        roi_only = tiling.get("roi_only", False)
+
+        tiles = []
+        owners = []  # (job_index, x0, y0, is_slice)
+        tile_counts = [0] * len(jobs)
+        for index, (cam_id, frame, _, _) in enumerate(jobs):
+            h, w = frame.shape[:2]
+            windows = tile_windows(w, h, tile_size, overlap)
+            regions = self.roi_regions.get(cam_id)
+            if roi_only and regions:
+                windows = filter_windows(windows, w, h, regions)
+            if windows == [(0, 0, w, h)]:
+                # 影格不大於切片時唯一的切片即整張影格，只推論一次且不計為切片成本
+                tiles.append(frame)
+                owners.append((index, 0, 0, False))
+                tile_counts[index] = 1
+                continue
+            for x0, y0, x1, y1 in windows:
+                tiles.append(frame[y0:y1, x0:x1])
+                owners.append((index, x0, y0, True))
+            tile_counts[index] = len(windows)
+            if full_frame:
+                tiles.append(frame)
+                owners.append((index, 0, 0, False))
+
+        per_frame = [[] for _ in jobs]
+        slice_time = [0.0] * len(jobs)
+        for i in range(0, len(tiles), batch_size):
+            batch = tiles[i : i + batch_size]
+            batch_start = time.perf_counter()
+            results = model(batch, verbose=False)
+            share = (time.perf_counter() - batch_start) / len(batch)
+            for (index, x0, y0, is_slice), result in zip(
+                owners[i : i + batch_size], results
+            ):
+                if is_slice:
+                    slice_time[index] += share
+                if result.boxes is None or len(result.boxes) == 0:
+                    continue
+                dets = result.boxes.data.cpu().numpy().astype(np.float32)
+                dets[:, [0, 2]] += x0
+                dets[:, [1, 3]] += y0
+                per_frame[index].append(dets)
+
+        outputs = []
+        for index, (cam_id, frame, _, _) in enumerate(jobs):
+            h, w = frame.shape[:2]
+            if per_frame[index]:
+                dets = merge_boxes(
+                    np.concatenate(per_frame[index]), tiling.get("merge_threshold", 0.5)
+                )
+                dets[:, [0, 2]] /= w
+                dets[:, [1, 3]] /= h
+            else:
+                dets = np.empty((0, 6), dtype=np.float32)
+            outputs.append((cam_id, dets, tile_counts[index], slice_time[index] * 1000))
+        return outputs
+
+    @staticmethod
+    def detect(model, frame):
+        """
+        Run YOLO on frame and return detections with shape [N,6]
+        (x1, y1, x2, y2, conf, cls), box coordinates normalized to [0, 1].
+        """
+        empty = np.empty((0, 6), dtype=np.float32)
+        results = model(frame, verbose=False)
+        if len(results) == 0:
+            return empty
+        result = results[0]
+        if result.boxes is None:
+            return empty
+        # Convert detections to numpy array with shape [N,6] (x1, y1, x2, y2, conf, cls)
+        dets = result.boxes.data.cpu().numpy().astype(np.float32)
+        h, w = frame.shape[:2]
+        dets[:, [0, 2]] /= w
+        dets[:, [1, 3]] /= h
+        return dets
+
+    def stop(self):
+        """停止檢測線程。"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self.wait()
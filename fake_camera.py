@@ -0,0 +1,219 @@
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+from urllib.parse import urlparse, parse_qs
+
+"""
+模擬攝影機模組
+FakeCapture 以 cv2.VideoCapture 相同的介面提供合成畫面或循環播放的影片檔，
+VideoThread 遇到 fake:// 網址時會改用此類別，不需要實體攝影機即可測試多攝影機負載。
+
+網址格式: fake://<名稱>?width=1920&height=1080&fps=25&pattern=bars&source=<影片檔>
+
+故障腳本以 load_script() 載入，時間以載入時刻為起點，事件格式:
+    {"at": 秒, "duration": 秒, "fault": 類型, "camera": 名稱 / 名稱列表 / "*"}
+故障類型:
+    disconnect  讀取失敗且無法重新開啟
+    freeze      串流停滯，不再產生新畫面
+    fps         幀率改為 "fps"
+    resolution  解析度改為 "width" x "height"
+
+每張畫面第一列前 8 個像素的藍色通道寫入擷取時間戳，可用 read_stamp() 取回以計算延遲。
+"""
+
+FAULT_TYPES = ("disconnect", "freeze", "fps", "resolution")
+
+_script_lock = threading.Lock()
+_script = []
+_script_start = 0.0
+
+
+def load_script(events, start=None):
+    """載入故障腳本，start 為時間起點（預設為現在）"""
+    global _script, _script_start
+    for event in events:
+        if event.get("fault") not in FAULT_TYPES:
+            raise ValueError(f"未知的故障類型: {event.get('fault')}")
+    with _script_lock:
+        _script = [dict(event) for event in events]
+        _script_start = time.time() if start is None else start
+    return _script_start
+
+
+def clear_script():
+    """清除故障腳本"""
+    load_script([])
+
+
+def active_fault(name, fault, now=None):
+    """回傳目前作用於攝影機的指定類型故障事件，沒有則回傳 None"""
+    now = time.time() if now is None else now
+    with _script_lock:
+        elapsed = now - _script_start
+        for event in _script:
+            if event["fault"] != fault:
+                continue
+            cameras = event.get("camera", "*")
+            if isinstance(cameras, str) and cameras != "*":
+                cameras = [cameras]
+            if cameras != "*" and name not in cameras:
+                continue
+            if event["at"] <= elapsed < event["at"] + event.get("duration", 0):
+                return event
+    return None
+
+
+def write_stamp(frame, ts):
+    """將時間戳寫入畫面左上角"""
+    frame[0, :8, 0] = np.frombuffer(struct.pack("<d", ts), dtype=np.uint8)
+
+
+def read_stamp(frame):
+    """讀取 write_stamp() 寫入的時間戳"""
+    return struct.unpack("<d", frame[0, :8, 0].tobytes())[0]
+
+
+class FakeCapture:
+    """模擬 cv2.VideoCapture 的 isOpened / grab / retrieve / read / release。"""
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        self.name = parsed.netloc or parsed.path.strip("/")
+        self.width = int(params.get("width", 1920))
+        self.height = int(params.get("height", 1080))
+        self.fps = float(params.get("fps", 25))
+        self.pattern = params.get("pattern", "bars")
+        self.source = params.get("source")  # 循環播放的影片檔（可選）
+
+        self._file = cv2.VideoCapture(self.source) if self.source else None
+        self._bases = {}  # (w, h) -> 背景圖樣
+        self._seq = 0
+        self._next_time = time.time()
+        self._grab_ts = 0.0
+        self._interrupted = threading.Event()
+        self._opened = active_fault(self.name, "disconnect") is None
+        if self._file is not None and not self._file.isOpened():
+            self._opened = False
+
+    def isOpened(self):
+        return self._opened
+
+    def grab(self):
+        """依目前幀率等待下一張畫面；斷線時回傳 False，停滯時阻塞"""
+        if not self._opened:
+            return False
+        if active_fault(self.name, "disconnect") is not None:
+            self._opened = False
+            return False
+        while active_fault(self.name, "freeze") is not None:
+            if self._interrupted.wait(0.05):
+                return False
+
+        fps_fault = active_fault(self.name, "fps")
+        fps = fps_fault["fps"] if fps_fault is not None else self.fps
+        now = time.time()
+        if self._next_time > now and self._interrupted.wait(self._next_time - now):
+            return False
+        self._next_time = max(self._next_time, now) + 1.0 / fps
+        self._seq += 1
+        self._grab_ts = time.time()
+        return True
+
+    def retrieve(self, image=None):
+        """產生畫面；提供尺寸相符的 image 時直接寫入（與 OpenCV 相同行為）"""
+        if not self._opened:
+            return False, None
+        res_fault = active_fault(self.name, "resolution")
+        if res_fault is not None:
+            size = (res_fault["width"], res_fault["height"])
+        else:
+            size = (self.width, self.height)
+        shape = (size[1], size[0], 3)
+        if image is None or image.shape != shape:
+            image = np.empty(shape, dtype=np.uint8)
+
+        if self._file is not None:
+            self.render_file(image, size)
+        else:
+            self.render_pattern(image, size)
+        write_stamp(image, self._grab_ts)
+        return True, image
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def interrupt(self):
+        """中斷阻塞中的 grab()（可由其他線程呼叫），之後 grab() 皆回傳 False"""
+        self._interrupted.set()
+        self._opened = False
+
+    def release(self):
+        self._opened = False
+        if self._file is not None:
+            self._file.release()
+
+    def render_pattern(self, image, size):
+        """合成圖樣加上移動方塊，讓每一幀內容都不同"""
+        base = self._bases.get(size)
+        if base is None:
+            base = self.make_base(size)
+            self._bases[size] = base
+        np.copyto(image, base)
+        w, h = size
+        box = max(8, h // 8)
+        x = (self._seq * 8) % max(1, w - box)
+        cv2.rectangle(
+            image,
+            (x, h // 2 - box // 2),
+            (x + box, h // 2 + box // 2),
+            (255, 255, 255),
+            -1,
+        )
+        cv2.putText(
+            image,
+            f"{self.name} #{self._seq}",
+            (20, h - 20),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1.0,
+            (255, 255, 255),
+            2,
+        )
+
+    def make_base(self, size):
+        w, h = size
+        if self.pattern == "noise":
+            rng = np.random.default_rng(abs(hash(self.name)) % (2**32))
+            return rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+        colors = [
+            (255, 255, 255),
+            (0, 255, 255),
+            (255, 255, 0),
+            (0, 255, 0),
+            (255, 0, 255),
+            (0, 0, 255),
+            (255, 0, 0),
+            (0, 0, 0),
+        ]
+        base = np.zeros((h, w, 3), dtype=np.uint8)
+        bar_w = max(1, w // len(colors))
+        for i, color in enumerate(colors):
+            base[:, i * bar_w : (i + 1) * bar_w] = color
+        return base
+
+    def render_file(self, image, size):
+        """循環播放影片檔，結束時回到開頭"""
+        ret, frame = self._file.read()
+        if not ret:
+            self._file.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._file.read()
+        if not ret:
+            image[:] = 0
+            return
+        if (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size)
+        np.copyto(image, frame)
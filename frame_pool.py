@@ -0,0 +1,116 @@
+import threading
+import time
+import numpy as np
+from collections import deque
+
+"""
+影格緩衝池模組
+FramePool 為每台攝影機保留預先配置的影格陣列，讓 OpenCV 直接解碼到既有緩衝區，
+避免每幀配置一張完整影像。緩衝區以引用計數管理：
+擷取線程取得 (acquire) 時計數為 1，主視窗與檢測線程使用時 retain/release，
+計數歸零後回收重用。另提供穩定狀態下的配置速率指標。
+使用中的緩衝區數量有上限（max_in_flight）：主視窗跟不上時，
+擷取線程以 available() 得知緩衝池已滿並略過發送，而不是持續配置新陣列。
+"""
+
+
+class FramePool:
+    def __init__(self, size=6, max_in_flight=6, rate_window=10.0):
+        self.size = size  # 最多保留的閒置緩衝區數量
+        self.max_in_flight = max_in_flight  # 同時使用中的緩衝區上限
+        self.rate_window = rate_window  # 配置速率的統計區間（秒）
+        self._lock = threading.Lock()
+        self._shape = None  # 目前影格形狀，解析度改變時更新
+        self._free = []
+        self._refs = {}  # id(buffer) -> [buffer, ref_count]
+        self._alloc_events = deque()  # [(time, bytes), ...]
+        self.allocations = 0  # 累計配置次數
+        self.allocated_bytes = 0  # 累計配置位元組數
+        self.skipped = 0  # 因緩衝區用盡而略過發送的影格數
+
+    def available(self):
+        """使用中的緩衝區未達上限時回傳 True；已滿則計入 skipped 並回傳 False"""
+        with self._lock:
+            if len(self._refs) < self.max_in_flight:
+                return True
+            self.skipped += 1
+            return False
+
+    def acquire(self):
+        """取得一個閒置緩衝區（計數為 1）；尚未知道影格形狀時回傳 None"""
+        with self._lock:
+            if self._shape is None:
+                return None
+            if self._free:
+                buf = self._free.pop()
+            else:
+                buf = np.empty(self._shape, dtype=np.uint8)
+                self._record_allocation(buf.nbytes)
+            self._refs[id(buf)] = [buf, 1]
+            return buf
+
+    def track(self, frame, buf):
+        """
+        登記解碼結果。若 OpenCV 未使用提供的緩衝區（首幀或解析度改變），
+        則改為追蹤新配置的陣列並更新影格形狀。
+        """
+        if frame is buf:
+            return frame
+        if buf is not None:
+            self.release(buf)
+        with self._lock:
+            if frame.shape != self._shape:
+                self._shape = frame.shape
+                self._free.clear()  # 舊解析度的緩衝區不再重用
+            self._record_allocation(frame.nbytes)
+            self._refs[id(frame)] = [frame, 1]
+        return frame
+
+    def retain(self, frame):
+        """增加引用計數；非本緩衝池的陣列則忽略"""
+        with self._lock:
+            entry = self._refs.get(id(frame))
+            if entry is not None and entry[0] is frame:
+                entry[1] += 1
+
+    def release(self, frame):
+        """減少引用計數，歸零時回收緩衝區"""
+        with self._lock:
+            entry = self._refs.get(id(frame))
+            if entry is None or entry[0] is not frame:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._refs[id(frame)]
+            if frame.shape == self._shape and len(self._free) < self.size:
+                self._free.append(frame)
+
+    def _record_allocation(self, nbytes):
+        """記錄一次配置（需持有鎖）"""
+        now = time.time()
+        self.allocations += 1
+        self.allocated_bytes += nbytes
+        self._alloc_events.append((now, nbytes))
+        self._trim(now)
+
+    def _trim(self, now):
+        while self._alloc_events and self._alloc_events[0][0] < now - self.rate_window:
+            self._alloc_events.popleft()
+
+    def allocation_rate(self):
+        """最近 rate_window 秒內的平均配置速率（位元組/秒）"""
+        with self._lock:
+            self._trim(time.time())
+            return sum(n for _, n in self._alloc_events) / self.rate_window
+
+    def stats(self):
+        """回傳緩衝池狀態"""
+        with self._lock:
+            return {
+                "in_use": len(self._refs),
+                "free": len(self._free),
+                "allocations": self.allocations,
+                "allocated_bytes": self.allocated_bytes,
+                "skipped": self.skipped,
+            }
@@ -0,0 +1,312 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+import numpy as np
+from PyQt5.QtCore import QMetaObject, Qt
+from PyQt5.QtWidgets import QApplication
+import fake_camera
+from fake_camera import read_stamp
+from main_window import MainWindow
+
+"""
+多攝影機負載與故障注入測試
+以 N 台 fake:// 模擬攝影機驅動完整的主視窗（擷取、合成、檢測與錄影線程），
+依故障腳本在執行中注入斷線、畫面停滯、幀率下降與解析度變更，
+結束時回報吞吐量、延遲與各故障的恢復時間。
+
+用法: python load_harness.py --cameras 16 --duration 60 --scenario mixed
+      python load_harness.py --cameras 4 --script faults.json --report report.json
+無顯示環境可加上 --offscreen。測試不會寫入使用者的攝影機設定，
+錄影片段與檢測紀錄寫入暫存目錄（或 --data-dir 指定的目錄）。
+測試時間由獨立線程的計時器控制，主線程事件迴圈被影格淹沒時仍會準時結束。
+"""
+
+# 內建情境，時間以秒計，相對於串流開始
+SCENARIOS = {
+    "baseline": [],
+    "disconnect": [
+        {"at": 10, "duration": 5, "fault": "disconnect", "camera": ["cam1", "cam2"]}
+    ],
+    "freeze": [{"at": 10, "duration": 5, "fault": "freeze", "camera": ["cam3"]}],
+    "fps_drop": [{"at": 10, "duration": 10, "fault": "fps", "fps": 5, "camera": "*"}],
+    "resolution": [
+        {
+            "at": 10,
+            "duration": 10,
+            "fault": "resolution",
+            "width": 1280,
+            "height": 720,
+            "camera": ["cam1"],
+        }
+    ],
+    "mixed": [
+        {"at": 8, "duration": 5, "fault": "disconnect", "camera": ["cam1"]},
+        {"at": 16, "duration": 4, "fault": "freeze", "camera": ["cam2"]},
+        {"at": 24, "duration": 8, "fault": "fps", "fps": 5, "camera": "*"},
+        {
+            "at": 36,
+            "duration": 8,
+            "fault": "resolution",
+            "width": 3840,
+            "height": 2160,
+            "camera": ["cam3", "cam4"],
+        },
+    ],
+}
+
+# 報告輸出後等待主視窗正常關閉的秒數，逾時則強制結束程序
+SHUTDOWN_GRACE = 10.0
+
+
+def fake_configs(count, width, height, fps, pattern, source):
+    """建立 count 台模擬攝影機的設定，名稱為 cam1、cam2..."""
+    configs = {}
+    for cam_id in range(1, count + 1):
+        params = {"width": width, "height": height, "fps": fps, "pattern": pattern}
+        if source:
+            params["source"] = source
+        configs[cam_id] = {
+            "ip": "",
+            "port": "",
+            "user": "",
+            "pwd": "",
+            "enabled": True,
+            "label_path": "",
+            "url": f"fake://cam{cam_id}?{urlencode(params)}",
+        }
+    return configs
+
+
+def affected_cameras(event, cam_ids):
+    """故障事件作用的攝影機 ID"""
+    cameras = event.get("camera", "*")
+    if cameras == "*":
+        return list(cam_ids)
+    if isinstance(cameras, str):
+        cameras = [cameras]
+    return [cam_id for cam_id in cam_ids if f"cam{cam_id}" in cameras]
+
+
+def percentile_ms(values, q):
+    return float(np.percentile(values, q) * 1000) if values else None
+
+
+class HarnessWindow(MainWindow):
+    """記錄影格到達時間、顯示延遲與錯誤的主視窗，不彈出對話框也不儲存設定"""
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir)
+        self.arrivals = {}  # cam_id -> [[到達時間, 擷取時間, 顯示完成時間], ...]
+        self._undisplayed = []  # 尚未合成顯示的到達紀錄
+        self.errors = {}  # cam_id -> [(時間, 訊息)]
+        self.composite_times = []  # 每次合成的耗時（秒）
+        self.quality_events = []  # [(時間, 畫質等級名稱)]
+        self.quality_controller.level_changed.connect(self.on_harness_quality)
+
+    def update_frame(self, frame, cam_id, ts):
+        arrived = time.time()
+        captured = read_stamp(frame)  # 交給主視窗後影格可能被釋放，先讀取
+        sender = self.sender()
+        current = sender is None or sender is self.threads.get(cam_id)
+        super().update_frame(frame, cam_id, ts)
+        if current:
+            record = [arrived, captured, None]  # 顯示時間於合成後填入
+            self.arrivals.setdefault(cam_id, []).append(record)
+            self._undisplayed.append(record)
+
+    def update_composite(self):
+        start = time.perf_counter()
+        super().update_composite()
+        self.composite_times.append(time.perf_counter() - start)
+        displayed = time.time()
+        for record in self._undisplayed:
+            record[2] = displayed
+        self._undisplayed = []
+
+    def on_harness_quality(self, level, settings):
+        self.quality_events.append((time.time(), settings["name"]))
+
+    def handle_error(self, msg, cam_id):
+        self.errors.setdefault(cam_id, []).append((time.time(), msg))
+        print(f"Camera {cam_id} 錯誤: {msg}")
+
+    def save_settings(self):
+        pass  # 模擬攝影機的設定不寫入使用者設定
+
+
+def build_report(window, events, start, end, warmup):
+    """
+    彙整吞吐量、延遲與恢復時間。
+    由計時線程呼叫，主線程仍在追加紀錄，因此先複製列表再讀取。
+    """
+    measured = end - start - warmup
+    arrivals = {
+        cam_id: list(window.arrivals.get(cam_id, []))
+        for cam_id in sorted(window.camera_configs)
+    }
+    pools = dict(window.frame_pools)
+    cameras = {}
+    for cam_id, cam_records in arrivals.items():
+        records = [r for r in cam_records if r[0] >= start + warmup]
+        arrival = [a - c for a, c, _ in records]
+        display = [d - c for _, c, d in records if d is not None]
+        times = [a for a, _, _ in records]
+        gaps = np.diff(times) if len(times) > 1 else [0.0]
+        cameras[cam_id] = {
+            "frames": len(records),
+            "fps": len(records) / measured if measured > 0 else 0.0,
+            "arrival_p50_ms": percentile_ms(arrival, 50),
+            "arrival_p95_ms": percentile_ms(arrival, 95),
+            "display_p50_ms": percentile_ms(display, 50),
+            "display_p95_ms": percentile_ms(display, 95),
+            "max_gap_s": float(np.max(gaps)),
+            "errors": len(window.errors.get(cam_id, [])),
+            # 緩衝池已滿而未發送的影格（主視窗跟不上的背壓）
+            "skipped": pools[cam_id].stats()["skipped"],
+        }
+
+    faults = []
+    for event in events:
+        fault_end = start + event["at"] + event.get("duration", 0)
+        for cam_id in affected_cameras(event, arrivals):
+            # 恢復時間：故障結束到第一張故障結束後擷取的影格顯示為止
+            recovered = next(
+                (d for _, c, d in arrivals[cam_id] if c >= fault_end and d is not None),
+                None,
+            )
+            faults.append(
+                {
+                    "camera": cam_id,
+                    "fault": event["fault"],
+                    "at": event["at"],
+                    "duration": event.get("duration", 0),
+                    "recovery_s": None if recovered is None else recovered - fault_end,
+                }
+            )
+
+    total_frames = sum(c["frames"] for c in cameras.values())
+    composites = list(window.composite_times)
+    return {
+        "cameras": cameras,
+        "faults": faults,
+        "total_fps": total_frames / measured if measured > 0 else 0.0,
+        "composites": len(composites),
+        "composite_p50_ms": percentile_ms(composites, 50),
+        "composite_p95_ms": percentile_ms(composites, 95),
+        "quality_changes": [
+            {"t": t - start, "level": name} for t, name in list(window.quality_events)
+        ],
+        "frame_alloc_mb_s": sum(pool.allocation_rate() for pool in pools.values())
+        / 1e6,
+    }
+
+
+def fmt_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_report(report):
+    print(
+        f"{'camera':>6} {'frames':>7} {'fps':>6} {'arr p50':>8} {'arr p95':>8} "
+        f"{'disp p50':>9} {'disp p95':>9} {'max gap':>8} {'errors':>6} {'skipped':>7}"
+    )
+    for cam_id, c in report["cameras"].items():
+        print(
+            f"{cam_id:>6} {c['frames']:>7} {c['fps']:>6.1f} "
+            f"{fmt_ms(c['arrival_p50_ms']):>8} {fmt_ms(c['arrival_p95_ms']):>8} "
+            f"{fmt_ms(c['display_p50_ms']):>9} {fmt_ms(c['display_p95_ms']):>9} "
+            f"{c['max_gap_s']:>7.2f}s {c['errors']:>6} {c['skipped']:>7}"
+        )
+    print(
+        f"總吞吐量 {report['total_fps']:.1f} fps，合成 {report['composites']} 次 "
+        f"(p50 {fmt_ms(report['composite_p50_ms'])} ms, "
+        f"p95 {fmt_ms(report['composite_p95_ms'])} ms)，"
+        f"影格配置 {report['frame_alloc_mb_s']:.1f} MB/s"
+    )
+    for change in report["quality_changes"]:
+        print(f"  {change['t']:6.1f}s 畫質等級 -> {change['level']}")
+    for fault in report["faults"]:
+        recovery = fault["recovery_s"]
+        recovery = "未恢復" if recovery is None else f"{recovery:.2f}s"
+        print(
+            f"  Camera {fault['camera']} {fault['fault']} "
+            f"@{fault['at']}s+{fault['duration']}s 恢復時間 {recovery}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多攝影機負載與故障注入測試")
+    parser.add_argument("--cameras", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--pattern", choices=("bars", "noise"), default="bars")
+    parser.add_argument("--source", help="以循環播放的影片檔取代合成圖樣")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="baseline")
+    parser.add_argument("--script", help="故障腳本 JSON（事件列表），優先於 --scenario")
+    parser.add_argument("--model", help="啟用 YOLO 檢測並使用此模型")
+    parser.add_argument("--report", help="將報告寫入 JSON 檔")
+    parser.add_argument("--data-dir", help="錄影片段與檢測紀錄的目錄（預設為暫存目錄）")
+    parser.add_argument("--offscreen", action="store_true", help="不開啟視窗")
+    args = parser.parse_args()
+
+    if args.offscreen:
+        os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            events = json.load(f)
+    else:
+        events = SCENARIOS[args.scenario]
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="load_harness_")
+    app = QApplication(sys.argv)
+    window = HarnessWindow(data_dir)
+    window.show()
+    if args.model:
+        window.on_yolo_settings_changed({"enabled": True, "model": args.model})
+
+    start = fake_camera.load_script(events)
+    window.apply_camera_configs(
+        fake_configs(
+            args.cameras, args.width, args.height, args.fps, args.pattern, args.source
+        )
+    )
+
+    closed = threading.Event()
+
+    def finish():
+        """於計時線程執行：輸出報告、停止擷取並要求主線程結束，逾時則強制結束"""
+        report = build_report(window, events, start, time.time(), args.warmup)
+        print_report(report)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        for thread in list(window.threads.values()):
+            thread.request_stop()  # 停止產生新影格，讓積壓的事件佇列消化
+        QMetaObject.invokeMethod(app, "quit", Qt.QueuedConnection)
+        if not closed.wait(SHUTDOWN_GRACE):
+            print(f"主視窗 {SHUTDOWN_GRACE:.0f} 秒內未關閉，強制結束")
+            sys.stdout.flush()
+            os._exit(2)
+
+    watchdog = threading.Timer(args.duration, finish)
+    watchdog.daemon = True
+    watchdog.start()
+    app.exec_()
+    watchdog.cancel()  # 視窗提前關閉時不再輸出報告
+    window.close()
+    closed.set()
+    if not args.data_dir:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,22 +12,41 @@ from PyQt5.QtWidgets import (
     QCheckBox,
     QAction,
 )
-from PyQt5.QtCore import Qt, QSettings
+from PyQt5.QtCore import Qt, QSettings, QEvent, QTimer
 from PyQt5.QtGui import QImage, QPixmap, QColor
 from ultralytics import YOLO
 from video_thread import VideoThread
 from camera_settings_dialog import CameraSettingsDialog
 from label_config_dock import LabelConfigDock
 from yolo_settings_dialog import YoloSettingsDialog
+from pre_event_buffer import PreEventBuffer, ClipWriterThread
+from detection_log import DetectionLog, DetectionLogThread
+from detection_thread import DetectionThread
+from quality_controller import QualityController
+from overlay_cache import OverlayCache, LABEL_TYPES, load_label_polygons
+from plate_recognition import PlateRecognitionThread
+from frame_pool import FramePool
+from compositor import grid_shape, fit_frame_into, render_grid
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import cv2
-import json
+import os
+import time
 
 """
 主視窗類別
 此類別負責管理應用程式的主界面和功能。
 """
 
+# 改變後需要重新連線的攝影機設定欄位，其餘欄位（如 label_path）可直接套用
+CONNECTION_KEYS = ("ip", "port", "user", "pwd", "enabled", "url")
+
+# 單一畫面模式下，背景攝影機維持連線的最低發送幀率（串流仍以原幀率接收與解碼）
+KEEPALIVE_FPS = 1
+
+# 畫面合成的最高更新率：影格到達只標記待更新，每個顯示週期最多合成一次
+DISPLAY_FPS = 30
+
 # 定義顏色常數
 COLORS = [
     (255, 0, 0),  # 紅色
@@ -42,8 +61,9 @@ COLORS = [
 # 主視窗類別
 # 此類別負責管理應用程式的主界面和功能。
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, data_dir="."):
         super().__init__()
+        self.data_dir = data_dir  # 事件錄影（clips）與檢測紀錄（detections）的存放目錄
         self.setWindowTitle("多攝影機 2×2 拼接監控系統")
 
         # 預設攝影機設定
@@ -97,16 +117,84 @@ class MainWindow(QMainWindow):
         self.camera_configs = self.load_settings()
 
         self.threads = {}
+        self._retiring_threads = set()  # 已要求停止但尚未結束的線程
         self.latest_frames = {}
+        # 每台攝影機的影格緩衝池，重新連線時沿用
+        self.frame_pools = {cam_id: FramePool() for cam_id in self.camera_configs}
         self.composited_image_bgr = None
+        self.focus_cam = None  # 單一畫面模式的攝影機 ID，None 表示拼接模式
+        self._grid_layout = None  # (cam_ids, cols, cell_w, cell_h)，供點擊換算
+        self._focus_canvas = None  # 單一畫面模式重複使用的原始解析度畫布
+        self._oldest_pending = None  # 尚未合成的影格中最早的擷取時間
+        self.overlay_cache = OverlayCache()  # 標籤多邊形的靜態圖層
+        self._label_regions = {}  # cam_id -> (label_path, [(label_type, box), ...])
+        self._offline_frames = {}  # (message, w, h) -> 離線畫面
+        # 各 cell 的縮放與疊加在執行緒池中並行繪製；攝影機數量可變，依核心數配置
+        # （執行緒依需要才建立，攝影機較少時不會全部啟動）
+        self.render_executor = ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 1,
+            thread_name_prefix="composite",
+        )
+
+        # 事件錄影：每台攝影機一個事件前緩衝區，共用一個背景寫檔線程
+        self.clip_writer = ClipWriterThread(
+            os.path.join(self.data_dir, "clips"), parent=self
+        )
+        self.clip_writer.clip_saved.connect(self.on_clip_saved)
+        self.clip_writer.error_signal.connect(self.handle_error)
+        self.clip_writer.start()
+        self.pre_event_buffers = {
+            cam_id: PreEventBuffer(cam_id, on_clip_ready=self.clip_writer.submit)
+            for cam_id in self.camera_configs
+        }
 
         self.label_config_dock = LabelConfigDock(self)
         self.addDockWidget(Qt.RightDockWidgetArea, self.label_config_dock)
-        self.label_config_dock.label_config_changed.connect(self.update_composite)
+        self.label_config_dock.label_config_changed.connect(
+            self.on_label_config_changed
+        )
 
         self.detection_enabled = False
         self.yolo_detector = None
         self.detection_settings = {"enabled": False, "model": "yolov8n.pt"}
+        self.latest_detections = {}  # cam_id -> [N,6] 正規化座標的檢測結果
+
+        # 檢測紀錄：背景線程批次寫入僅追加的欄位式儲存
+        self.detection_log_thread = DetectionLogThread(
+            DetectionLog(os.path.join(self.data_dir, "detections")), parent=self
+        )
+        self.detection_log_thread.error_signal.connect(self.handle_error)
+        self.detection_log_thread.start()
+
+        # 檢測在獨立線程執行，主線程只送出最新影格並接收結果
+        self.detection_thread = DetectionThread(self.detection_log_thread, parent=self)
+        self.detection_thread.detections_ready.connect(self.on_detections_ready)
+        self.detection_thread.tile_stats_ready.connect(self.on_tile_stats_ready)
+        self.detection_thread.start()
+
+        # 車牌辨識：裁切車輛框與 plate 區域，批次送入第二階段模型
+        self.plate_enabled = False
+        self.plate_recognizer = None
+        self.latest_plates = {}  # cam_id -> {key: result}
+        self.plate_thread = PlateRecognitionThread(parent=self)
+        self.plate_thread.plates_ready.connect(self.on_plates_ready)
+        self.plate_thread.start()
+        # 車輛框由檢測線程以同一張影格裁切，避免使用舊檢測框裁切新影格
+        self.detection_thread.plate_thread = self.plate_thread
+
+        # 依合成負載、顯示延遲、背壓略過的影格與檢測積壓自動調整畫質
+        self.quality_controller = QualityController(
+            backlog_source=self.detection_thread.backlog,
+            drop_source=self.skipped_frames,
+            parent=self,
+        )
+        self.quality_controller.level_changed.connect(self.on_quality_level_changed)
+
+        # 合併多台攝影機的影格更新，每個顯示週期只合成一次
+        self.composite_timer = QTimer(self)
+        self.composite_timer.setSingleShot(True)
+        self.composite_timer.setInterval(1000 // DISPLAY_FPS)
+        self.composite_timer.timeout.connect(self.update_composite)
 
         self.init_ui()
 
@@ -118,6 +206,7 @@ class MainWindow(QMainWindow):
         self.display_label = QLabel()
         self.display_label.setAlignment(Qt.AlignCenter)
         self.display_label.setStyleSheet("background-color: black;")
+        self.display_label.installEventFilter(self)  # 雙擊切換單一畫面
 
         # 主要布局
         central_widget = QWidget()
@@ -135,6 +224,15 @@ class MainWindow(QMainWindow):
             self.settings
         )  # Load label colors/settings
 
+        # 狀態列：影格配置速率（緩衝池生效時應接近 0）
+        self.alloc_rate_label = QLabel()
+        self.statusBar().addPermanentWidget(self.alloc_rate_label)
+        self.tile_stats_label = QLabel()
+        self.statusBar().addPermanentWidget(self.tile_stats_label)
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_allocation_stats)
+        self.stats_timer.start(2000)
+
     def create_menu(self):
         menubar = self.menuBar()
         settings_menu = menubar.addMenu("設定")
@@ -143,6 +241,18 @@ class MainWindow(QMainWindow):
         camera_settings_action.triggered.connect(self.open_camera_settings_dialog)
         settings_menu.addAction(camera_settings_action)
 
+        record_menu = menubar.addMenu("錄影")
+        trigger_clip_action = QAction("手動觸發錄影", self)
+        trigger_clip_action.setShortcut("F9")
+        trigger_clip_action.triggered.connect(self.trigger_all_clips)
+        record_menu.addAction(trigger_clip_action)
+
+        view_menu = menubar.addMenu("顯示")
+        exit_focus_action = QAction("返回拼接畫面", self)
+        exit_focus_action.setShortcut("Esc")
+        exit_focus_action.triggered.connect(lambda: self.set_focus_camera(None))
+        view_menu.addAction(exit_focus_action)
+
     def create_control_panel(self):
         panel = QHBoxLayout()
 
@@ -200,54 +310,291 @@ class MainWindow(QMainWindow):
         self.update_composite()
 
     def start_streams(self):
-        """開始所有已啟用攝影機的串流"""
-        for cam_id, config in self.camera_configs.items():
-            if config["enabled"]:
-                rtsp_url = f"rtsp://{config['user']}:{config['pwd']}@{config['ip']}:{config['port']}/"
-                thread = VideoThread(rtsp_url, cam_id)
-                thread.frame_signal.connect(self.update_frame)
-                thread.error_signal.connect(self.handle_error)
-                thread.start()
-                self.threads[cam_id] = thread
+        """開始所有已啟用且尚未串流的攝影機"""
+        for cam_id in self.camera_configs:
+            thread = self.threads.get(cam_id)
+            if thread is None or thread.isFinished():
+                self.threads.pop(cam_id, None)  # 開啟失敗而結束的線程可重試
+                self.start_stream(cam_id)
+
+    def start_stream(self, cam_id):
+        """開始單一攝影機的串流"""
+        config = self.camera_configs[cam_id]
+        if not config["enabled"]:
+            return
+        # 設定中的 url 優先（例如負載測試的 fake:// 來源），否則組成 RTSP URL
+        rtsp_url = config.get("url") or (
+            f"rtsp://{config['user']}:{config['pwd']}@{config['ip']}:{config['port']}/"
+        )
+        if cam_id not in self.frame_pools:
+            self.frame_pools[cam_id] = FramePool()
+        if cam_id not in self.pre_event_buffers:
+            self.pre_event_buffers[cam_id] = PreEventBuffer(
+                cam_id, on_clip_ready=self.clip_writer.submit
+            )
+        thread = VideoThread(
+            rtsp_url,
+            cam_id,
+            self.pre_event_buffers[cam_id],
+            self.frame_pools[cam_id],
+        )
+        thread.max_fps = self.capture_fps_for(cam_id)
+        thread.frame_signal.connect(self.update_frame)
+        thread.error_signal.connect(self.handle_error)
+        thread.finished.connect(
+            lambda c=cam_id, t=thread: self.on_stream_finished(c, t)
+        )
+        thread.start()
+        self.threads[cam_id] = thread
+
+    def on_stream_finished(self, cam_id, thread):
+        """擷取線程自行結束（例如來源無法開啟）時，不再視為串流中"""
+        if self.threads.get(cam_id) is thread:
+            del self.threads[cam_id]
 
     def stop_streams(self):
-        """停止所有串流執行緒"""
-        for thread in self.threads.values():
-            thread.stop()
-        self.threads.clear()
-
-    def update_frame(self, frame, cam_id):
-        """接收來自攝影機的影格信號"""
-        self.latest_frames[cam_id] = frame
+        """停止所有串流執行緒（不阻塞，各線程同時關閉）"""
+        for cam_id in list(self.threads):
+            self.stop_stream(cam_id)
+
+    def stop_stream(self, cam_id):
+        """
+        停止單一攝影機的串流但不等待線程結束。
+        線程結束前保留參考，結束後才釋放。
+        frame_signal 保持連線：佇列中殘留的影格仍會送達 update_frame，
+        由其釋放回緩衝池（中斷連線會丟棄這些影格，緩衝區永遠不會歸還）。
+        """
+        thread = self.threads.pop(cam_id, None)
+        if thread is None:
+            return
+        thread.error_signal.disconnect(self.handle_error)
+        self._retiring_threads.add(thread)
+        thread.finished.connect(lambda t=thread: self._retiring_threads.discard(t))
+        thread.request_stop()
+        if thread.isFinished():
+            self._retiring_threads.discard(thread)
+        self.pre_event_buffers[cam_id].flush()  # 串流停止時寫出未完成的片段
+
+    def wait_for_stopped_streams(self):
+        """
+        等待所有已要求停止的線程結束。
+        線程參考由 finished 信號移除，確保排在其前的影格都已送達並釋放。
+        """
+        for thread in list(self._retiring_threads):
+            thread.wait()
+
+    def apply_camera_configs(self, new_configs):
+        """
+        比對新舊攝影機設定，只重新連線連線參數有變的攝影機，
+        其餘欄位（如 label_path）直接套用，不中斷串流。
+        """
+        old_configs = self.camera_configs
+        self.camera_configs = new_configs
+        for cam_id in set(old_configs) - set(new_configs):
+            self.stop_stream(cam_id)  # 已移除的攝影機
+            self.set_latest_frame(cam_id, None)
+            self.latest_detections.pop(cam_id, None)
+        for cam_id, config in new_configs.items():
+            old = old_configs.get(cam_id, {})
+            if any(old.get(key) != config.get(key) for key in CONNECTION_KEYS):
+                self.stop_stream(cam_id)
+                self.set_latest_frame(cam_id, None)
+                self.latest_detections.pop(cam_id, None)
+        self.start_streams()
+
+    def update_frame(self, frame, cam_id, ts):
+        """接收來自攝影機的影格信號，ts 為擷取時間"""
+        sender = self.sender()
+        if sender is not None and sender is not self.threads.get(cam_id):
+            self.frame_pools[cam_id].release(frame)
+            return  # 已停止線程在佇列中殘留的影格
+        self.set_latest_frame(cam_id, frame)
+        if self.detection_enabled:
+            if self.detection_settings.get("tile_roi_only", False):
+                self.detection_thread.roi_regions[cam_id] = [
+                    box for _, box in self.label_regions(cam_id)
+                ]
+            self.detection_thread.submit(cam_id, frame, self.frame_pools[cam_id], ts)
+        if self.plate_enabled:
+            self.submit_plate_regions(cam_id, frame)
+        if self.focus_cam is None or cam_id == self.focus_cam:
+            self.schedule_composite(ts)
+
+    def schedule_composite(self, ts):
+        """標記畫面待更新，於下一個顯示週期合成（不在每張影格到達時合成）"""
+        if self._oldest_pending is None or ts < self._oldest_pending:
+            self._oldest_pending = ts
+        if not self.composite_timer.isActive():
+            self.composite_timer.start()
+
+    def skipped_frames(self):
+        """各攝影機因緩衝池已滿而略過的累計影格數（可於取樣線程呼叫）"""
+        return sum(pool.skipped for pool in list(self.frame_pools.values()))
+
+    def set_latest_frame(self, cam_id, frame):
+        """
+        更新攝影機的最新影格。新影格沿用擷取線程交出的引用，
+        被取代的影格則釋放回緩衝池。
+        """
+        old = self.latest_frames.pop(cam_id, None)
+        if frame is not None:
+            self.latest_frames[cam_id] = frame
+        if old is not None and old is not frame:
+            self.frame_pools[cam_id].release(old)
+
+    def update_allocation_stats(self):
+        """更新狀態列的影格配置速率"""
+        rate = sum(pool.allocation_rate() for pool in self.frame_pools.values())
+        self.alloc_rate_label.setText(f"影格配置: {rate / 1e6:.1f} MB/s")
+
+    def on_detections_ready(self, dets, cam_id):
+        """接收檢測線程的結果，於下一次合成時繪製"""
+        if self.detection_enabled:
+            self.latest_detections[cam_id] = dets
+
+    def on_plates_ready(self, results, cam_id):
+        """接收車牌辨識結果，於下一次合成時繪製"""
+        if self.plate_enabled:
+            self.latest_plates[cam_id] = results
+
+    def submit_plate_regions(self, cam_id, frame):
+        """
+        將 plate 標籤區域送交車牌辨識線程。
+        車輛框由檢測線程連同檢測所用的影格送出。
+        """
+        regions = self.plate_label_regions(cam_id)
+        if regions:
+            self.plate_thread.submit(cam_id, frame, plate_regions=regions)
+
+    def plate_label_regions(self, cam_id):
+        """取得標籤 JSON 中 plate 多邊形的外接框 [(key, box), ...]"""
+        return [
+            (("region", i), box)
+            for i, (label_type, box) in enumerate(self.label_regions(cam_id))
+            if label_type == "plate"
+        ]
+
+    def label_regions(self, cam_id):
+        """
+        取得標籤 JSON 中各多邊形的正規化外接框 [(label_type, box), ...]，
+        label_path 改變時重新讀取。
+        """
+        label_path = self.camera_configs[cam_id]["label_path"]
+        cached = self._label_regions.get(cam_id)
+        if cached is not None and cached[0] == label_path:
+            return cached[1]
+        regions = []
+        if label_path:
+            try:
+                polygons = load_label_polygons(label_path)
+            except Exception as e:
+                print(f"label_regions error: {e}")
+                polygons = []
+            for label_type, pts_norm in polygons:
+                xs = [p[0] for p in pts_norm]
+                ys = [p[1] for p in pts_norm]
+                regions.append((label_type, (min(xs), min(ys), max(xs), max(ys))))
+        self._label_regions[cam_id] = (label_path, regions)
+        return regions
+
+    def on_tile_stats_ready(self, cam_id, tile_count, added_ms):
+        """顯示切片推論的切片數與增加的延遲"""
+        self.tile_stats_label.setText(
+            f"切片 Camera {cam_id}: {tile_count} 片, +{added_ms:.0f} ms"
+        )
+
+    def on_quality_level_changed(self, level, settings):
+        """套用品質控制器的新設定"""
+        self.apply_capture_schedule()
+        self.statusBar().showMessage(f"畫質等級: {settings['name']}", 5000)
         self.update_composite()
 
-    def update_composite(self):
-        """更新拼接影像"""
-        if not self.latest_frames:
+    def capture_fps_for(self, cam_id):
+        """攝影機的發送幀率上限：單一畫面模式下背景攝影機降為維持連線的幀率"""
+        if self.focus_cam is None:
+            return self.quality_controller.settings["capture_fps"]
+        if cam_id == self.focus_cam:
+            return None
+        return KEEPALIVE_FPS
+
+    def apply_capture_schedule(self):
+        """依品質等級與單一畫面模式更新發送幀率與檢測排程，不重新連線"""
+        for cam_id, thread in self.threads.items():
+            thread.max_fps = self.capture_fps_for(cam_id)
+        settings = self.quality_controller.settings
+        self.detection_thread.min_interval = settings["detection_interval"]
+        self.detection_thread.priority_cam = self.focus_cam
+
+    # ============ 單一畫面模式 ============
+    def set_focus_camera(self, cam_id):
+        """切換單一畫面模式，cam_id 為 None 時返回拼接畫面"""
+        if cam_id == self.focus_cam:
             return
+        self.focus_cam = cam_id
+        self.apply_capture_schedule()
+        if cam_id is None:
+            self._focus_canvas = None
+            self.statusBar().showMessage("返回拼接畫面", 3000)
+        else:
+            self.statusBar().showMessage(f"單一畫面: Camera {cam_id}", 3000)
+        self.update_composite()
 
-        # 獲取目標尺寸
-        aspect = self.display_settings["aspect_ratio"]
+    def eventFilter(self, obj, event):
+        if obj is self.display_label and event.type() == QEvent.MouseButtonDblClick:
+            if self.focus_cam is not None:
+                self.set_focus_camera(None)
+            else:
+                cam_id = self.camera_at(event.pos())
+                if cam_id is not None:
+                    self.set_focus_camera(cam_id)
+            return True
+        return super().eventFilter(obj, event)
+
+    def camera_at(self, pos):
+        """將顯示區域上的座標換算為所在 cell 的攝影機 ID"""
+        if self.composited_image_bgr is None or self._grid_layout is None:
+            return None
+        img_h, img_w = self.composited_image_bgr.shape[:2]
+        label_w, label_h = self.display_label.width(), self.display_label.height()
+        scale = min(label_w / img_w, label_h / img_h)
+        x = (pos.x() - (label_w - img_w * scale) / 2) / scale
+        y = (pos.y() - (label_h - img_h * scale) / 2) / scale
+        if not (0 <= x < img_w and 0 <= y < img_h):
+            return None
+        if self.display_settings["rotation"]:
+            # 順時針旋轉 90 度的反向換算
+            x, y = y, img_w - 1 - x
+
+        cam_ids, cols, cell_w, cell_h = self._grid_layout
+        index = int(y // cell_h) * cols + int(x // cell_w)
+        if index < len(cam_ids):
+            return cam_ids[index]
+        return None
+
+    def composite_resolution(self):
+        """合成解析度：品質控制器降級時不超過其指定的解析度"""
         res = self.display_settings["resolution"]
-        final_w, final_h = self.display_settings["resolutions"][res][aspect]
+        limit = self.quality_controller.settings["resolution"]
+        if limit is not None:
+            resolutions = self.display_settings["resolutions"]
+            aspect = self.display_settings["aspect_ratio"]
+            if resolutions[limit][aspect] < resolutions[res][aspect]:
+                res = limit
+        return res
 
-        # 建立拼接畫布
-        cell_w, cell_h = final_w // 2, final_h // 2
-        collage = np.zeros((final_h, final_w, 3), dtype=np.uint8)
+    def update_composite(self):
+        """更新拼接影像"""
+        self.composite_timer.stop()
+        if not self.latest_frames:
+            return
+        start = time.perf_counter()
+        pending, self._oldest_pending = self._oldest_pending, None
 
         try:
-            for i, cam_id in enumerate([1, 2, 3, 4]):
-                r, c = divmod(i, 2)
-                y0, x0 = r * cell_h, c * cell_w
-
-                frame = self.get_camera_frame(cam_id, cell_w, cell_h)
-                if frame is not None:
-                    # 畫標籤
-                    if self.camera_configs[cam_id]["label_path"]:
-                        label_path = self.camera_configs[cam_id]["label_path"]
-                        self.draw_label_car_polygon(frame, label_path)
-
-                    collage[y0 : y0 + cell_h, x0 : x0 + cell_w] = frame
+            if self.focus_cam is not None:
+                collage = self.compose_focus(self.focus_cam)
+            else:
+                collage = self.compose_grid()
 
             if self.display_settings["rotation"]:
                 collage = cv2.rotate(collage, cv2.ROTATE_90_CLOCKWISE)
@@ -257,20 +604,90 @@ class MainWindow(QMainWindow):
 
         except Exception as e:
             QMessageBox.warning(self, "錯誤", f"更新影像時發生錯誤: {str(e)}")
+        finally:
+            self.quality_controller.record_composite(time.perf_counter() - start)
+            if pending is not None:
+                self.quality_controller.record_lag(time.time() - pending)
 
-    def get_camera_frame(self, cam_id, cell_w, cell_h):
-        """獲取單一攝影機的影格"""
-        if not self.camera_configs[cam_id]["enabled"]:
-            return self.create_offline_frame(f"Camera {cam_id} 已停用", cell_w, cell_h)
+    def compose_grid(self):
+        """合成格狀拼接畫面（4 台為 2×2）"""
+        # 獲取目標尺寸
+        aspect = self.display_settings["aspect_ratio"]
+        res = self.composite_resolution()
+        final_w, final_h = self.display_settings["resolutions"][res][aspect]
+
+        # 建立拼接畫布
+        cam_ids = sorted(self.camera_configs)
+        cols, rows = grid_shape(len(cam_ids))
+        cell_w, cell_h = final_w // cols, final_h // rows
+        collage = np.zeros((final_h, final_w, 3), dtype=np.uint8)
+        self._grid_layout = (cam_ids, cols, cell_w, cell_h)
 
-        if cam_id not in self.latest_frames:
-            return self.create_offline_frame(f"Camera {cam_id} 無訊號", cell_w, cell_h)
+        return render_grid(
+            collage, cam_ids, cols, self.render_cell, self.render_executor
+        )
+
+    def compose_focus(self, cam_id):
+        """以原始解析度合成單一攝影機畫面"""
+        frame = self.latest_frames.get(cam_id)
+        if frame is None or not self.camera_configs[cam_id]["enabled"]:
+            aspect = self.display_settings["aspect_ratio"]
+            res = self.composite_resolution()
+            final_w, final_h = self.display_settings["resolutions"][res][aspect]
+            canvas = np.zeros((final_h, final_w, 3), dtype=np.uint8)
+            self.render_cell(cam_id, canvas)
+            return canvas
+
+        canvas = self._focus_canvas
+        if canvas is None or canvas.shape != frame.shape:
+            canvas = np.empty_like(frame)  # 首次或解析度改變時才配置
+            self._focus_canvas = canvas
+        np.copyto(canvas, frame)
+        h, w = canvas.shape[:2]
+        self.draw_results(cam_id, canvas, (w, h, 0, 0))
+        self.apply_label_layer(cam_id, canvas)
+        return canvas
 
-        frame = self.latest_frames[cam_id]
-        return self.fit_frame_to_cell(frame, cell_w, cell_h)
+    def apply_label_layer(self, cam_id, image_bgr):
+        """畫標籤（套用快取的靜態圖層，就地修改）"""
+        label_path = self.camera_configs[cam_id]["label_path"]
+        if label_path:
+            h, w = image_bgr.shape[:2]
+            layer = self.overlay_cache.get_layer(
+                cam_id, label_path, w, h, self.label_overlay_style()
+            )
+            layer.apply(image_bgr)
+
+    def render_cell(self, cam_id, cell):
+        """
+        將單一攝影機的畫面繪製到 cell 切片（就地修改）。
+        在合成執行緒池中執行，各 cell 互不重疊。
+        """
+        cell_h, cell_w = cell.shape[:2]
+        frame = self.latest_frames.get(cam_id)
+        if not self.camera_configs[cam_id]["enabled"]:
+            message = f"Camera {cam_id} 已停用"
+            cell[:] = self.create_offline_frame(message, cell_w, cell_h)
+        elif frame is None:
+            message = f"Camera {cam_id} 無訊號"
+            cell[:] = self.create_offline_frame(message, cell_w, cell_h)
+        else:
+            geometry = fit_frame_into(frame, cell, self.scaling_interpolation())
+            self.draw_results(cam_id, cell, geometry)
+        self.apply_label_layer(cam_id, cell)
+
+    def draw_results(self, cam_id, image_bgr, geometry):
+        """繪製攝影機目前的檢測框與車牌辨識結果"""
+        if self.detection_enabled and cam_id in self.latest_detections:
+            self.draw_detections(image_bgr, self.latest_detections[cam_id], geometry)
+        if self.plate_enabled and cam_id in self.latest_plates:
+            self.draw_plates(image_bgr, self.latest_plates[cam_id], geometry)
 
     def create_offline_frame(self, message, width, height):
-        """創建離線狀態的影格"""
+        """創建離線狀態的影格（快取重用，呼叫端不可修改）"""
+        key = (message, width, height)
+        if key in self._offline_frames:
+            return self._offline_frames[key]
         frame = np.zeros((height, width, 3), dtype=np.uint8)
         cv2.putText(
             frame,
@@ -281,62 +698,30 @@ class MainWindow(QMainWindow):
             (0, 0, 255),
             2,
         )
+        self._offline_frames[key] = frame
         return frame
 
-    def fit_frame_to_cell(self, frame_bgr, cell_w, cell_h):
-        """
-        等比例縮放影像以填滿 cell，保持原始比例。
-        """
-        h, w = frame_bgr.shape[:2]
-        scale = min(cell_w / w, cell_h / h)
-        new_w = int(w * scale)
-        new_h = int(h * scale)
-        resized = cv2.resize(frame_bgr, (new_w, new_h))
-
-        # 建立一張 cell 大小的黑底
-        canvas = np.zeros((cell_h, cell_w, 3), dtype=np.uint8)
-        off_x = (cell_w - new_w) // 2
-        off_y = (cell_h - new_h) // 2
-        canvas[off_y : off_y + new_h, off_x : off_x + new_w] = resized
-
-        return canvas
+    def scaling_interpolation(self):
+        """依品質等級選擇縮放演算法"""
+        if self.quality_controller.settings["fast_scaling"]:
+            return cv2.INTER_NEAREST
+        return cv2.INTER_LINEAR
+
+    def label_overlay_style(self):
+        """從 side panel 取得各標籤類型的顯示狀態與顏色"""
+        dock = self.label_config_dock
+        return {
+            label_type: (
+                dock.label_states[label_type]["visible"],
+                dock.get_label_color(label_type),
+            )
+            for label_type in LABEL_TYPES
+        }
 
-    def draw_label_car_polygon(self, image_bgr, label_json_path):
-        """
-        在縮放後影像上畫出所有類型的標籤多邊形
-        根據 side panel 的設定決定是否顯示及顏色
-        """
-        h, w = image_bgr.shape[:2]
-        try:
-            with open(label_json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for obj in data.get("labels", []):
-                label_type = obj.get("label_type")
-                # 檢查標籤是否可見
-                if label_type in ["car", "parking", "plate"]:
-                    visible = self.label_config_dock.label_states[label_type]["visible"]
-                    if not visible:
-                        continue  # 如果不可見則跳過繪製
-
-                    # 獲取顏色（目前都使用一般狀態的顏色）
-                    color = self.label_config_dock.get_label_color(label_type)
-
-                    pts_norm = obj.get("points_normalized", [])
-                    if pts_norm:
-                        polygon = []
-                        for nx, ny in pts_norm:
-                            px = int(nx * w)
-                            py = int(ny * h)
-                            polygon.append((px, py))
-                        if polygon:
-                            poly_np = np.array([polygon], dtype=np.int32)
-                            cv2.polylines(image_bgr, poly_np, True, color, 2)
-        except FileNotFoundError as e:
-            print(f"draw_label_car_polygon error: {e}")
-            return image_bgr  # 返回原始影像
-        except Exception as e:
-            print(f"draw_label_car_polygon unexpected error: {e}")
-            return image_bgr  # 返回原始影像
+    def on_label_config_changed(self):
+        """標籤顯示設定改變時重建圖層"""
+        self.overlay_cache.invalidate()
+        self.update_composite()
 
     def update_label_resized(self):
         """將拼接影像轉換為 QPixmap 並顯示在 QLabel 上"""
@@ -349,17 +734,43 @@ class MainWindow(QMainWindow):
                 image_rgb.data, width, height, bytes_per_line, QImage.Format_RGB888
             )
             pixmap = QPixmap.fromImage(q_img)
+            if self.quality_controller.settings["fast_scaling"]:
+                transform = Qt.FastTransformation
+            else:
+                transform = Qt.SmoothTransformation
             self.display_label.setPixmap(
                 pixmap.scaled(
                     self.display_label.size(),
                     Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation,
+                    transform,
                 )
             )
 
+    # ============ 事件錄影 ============
+    def trigger_clip(self, cam_id, reason="trigger"):
+        """觸發單一攝影機的事件錄影（事件前 + 事件後影格）"""
+        if cam_id in self.threads:
+            self.pre_event_buffers[cam_id].trigger(reason)
+
+    def trigger_all_clips(self):
+        """手動熱鍵：觸發所有串流中攝影機的錄影"""
+        for cam_id in self.threads:
+            self.trigger_clip(cam_id, "manual")
+
+    def on_clip_saved(self, path, cam_id):
+        self.statusBar().showMessage(f"Camera {cam_id} 片段已儲存: {path}", 5000)
+
     # ============ 視窗關閉前 ============
     def closeEvent(self, event):
         self.stop_streams()
+        self.wait_for_stopped_streams()
+        self.composite_timer.stop()
+        self.quality_controller.stop()
+        self.clip_writer.stop()
+        self.detection_thread.stop()
+        self.plate_thread.stop()
+        self.detection_log_thread.stop()
+        self.render_executor.shutdown()
         self.save_settings()
         super().closeEvent(event)
 
@@ -372,11 +783,9 @@ class MainWindow(QMainWindow):
         dlg = CameraSettingsDialog(self.camera_configs, self)
         dlg.settings_changed.connect(self.update_composite)  # 新增此行
         if dlg.exec_():
-            self.camera_configs = dlg.get_configs()
+            self.apply_camera_configs(dlg.get_configs())
             self.save_settings()
             QMessageBox.information(self, "訊息", "已更新攝影機設定")
-            self.stop_streams()
-            self.start_streams()
             self.update_composite()  # 新增此行以即時更新畫面
 
     def load_settings(self):
@@ -430,6 +839,26 @@ class MainWindow(QMainWindow):
             self.load_yolo_model(new_settings.get("model", "yolov8n.pt"))
         else:
             self.yolo_detector = None
+            self.latest_detections.clear()
+        self.detection_thread.set_model(self.yolo_detector)
+        if new_settings.get("tiled", False):
+            self.detection_thread.tiling = {
+                "tile_size": 640,
+                "overlap": 0.2,
+                "roi_only": new_settings.get("tile_roi_only", False),
+            }
+        else:
+            self.detection_thread.tiling = None
+            self.tile_stats_label.clear()
+
+        self.plate_enabled = new_settings.get("plate_enabled", False)
+        if self.plate_enabled:
+            self.load_plate_model(new_settings.get("plate_model", ""))
+        else:
+            self.plate_recognizer = None
+        if self.plate_recognizer is None:
+            self.latest_plates.clear()
+        self.plate_thread.set_model(self.plate_recognizer)
         self.update_composite()
 
     def load_yolo_model(self, model_path):
@@ -442,20 +871,27 @@ class MainWindow(QMainWindow):
             self.yolo_detector = None
             self.detection_enabled = False
 
-    def apply_detection(self, frame):
-        """Apply YOLO detection on frame and draw bounding boxes"""
+    def load_plate_model(self, model_path):
+        try:
+            self.plate_recognizer = YOLO(model_path)
+        except Exception as e:
+            QMessageBox.warning(
+                self, "Plate Model Error", f"Failed to load plate model: {str(e)}"
+            )
+            self.plate_recognizer = None
+            self.plate_enabled = False
+
+    def draw_detections(self, frame, dets, geometry):
+        """
+        Draw normalized detections onto frame.
+        geometry is (content_w, content_h, off_x, off_y) of the image area.
+        """
+        content_w, content_h, off_x, off_y = geometry
         try:
-            results = self.yolo_detector(frame)
-            if len(results) == 0:
-                return frame
-            result = results[0]
-            if result.boxes is None:
-                return frame
-            # Convert detections to numpy array with shape [N,6] (x1, y1, x2, y2, conf, cls)
-            dets = result.boxes.data.cpu().numpy()
             for det in dets:
                 x1, y1, x2, y2, conf, cls_id = det
-                x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
+                x1, x2 = [int(v * content_w) + off_x for v in (x1, x2)]
+                y1, y2 = [int(v * content_h) + off_y for v in (y1, y2)]
                 if hasattr(self.yolo_detector, "names"):
                     label = self.yolo_detector.names[int(cls_id)]
                 else:
@@ -473,9 +909,29 @@ class MainWindow(QMainWindow):
                 )
             return frame
         except Exception as e:
-            print(f"Detection error: {e}")
+            print(f"Draw detection error: {e}")
             return frame
 
+    def draw_plates(self, frame, plates, geometry):
+        """Draw recognized plate text below each plate or car region."""
+        content_w, content_h, off_x, off_y = geometry
+        for result in plates.values():
+            if not result["text"]:
+                continue
+            x1, _, _, y2 = result["box"]
+            x = int(x1 * content_w) + off_x
+            y = int(y2 * content_h) + off_y + 15
+            cv2.putText(
+                frame,
+                result["text"],
+                (x, y),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 255, 255),
+                2,
+            )
+        return frame
+
     def set_camera_capture_data(self, data):
         """從加載的設定中設置相機捕捉資料。"""
         print("Camera capture data set:", data)
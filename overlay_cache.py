@@ -0,0 +1,102 @@
+import json
+import cv2
+import numpy as np
+
+"""
+靜態疊加圖層快取模組
+標籤 JSON 中的多邊形與離線畫面的文字在每一幀都相同，
+因此每個 cell 只在設定改變時繪製一次圖層（遮罩 + 顏色），
+之後每幀以一次遮罩複製套用，成本與多邊形數量無關。
+"""
+
+LABEL_TYPES = ["car", "parking", "plate"]
+
+
+def load_label_polygons(label_json_path):
+    """讀取標籤 JSON，回傳 [(label_type, points_normalized), ...]"""
+    with open(label_json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    polygons = []
+    for obj in data.get("labels", []):
+        label_type = obj.get("label_type")
+        pts_norm = obj.get("points_normalized", [])
+        if label_type in LABEL_TYPES and pts_norm:
+            polygons.append((label_type, pts_norm))
+    return polygons
+
+
+class OverlayLayer:
+    """已繪製的靜態圖層，只保存有像素的最小矩形區域。"""
+
+    def __init__(self, mask, color):
+        ys, xs = np.nonzero(mask)
+        if len(ys) == 0:
+            self.bbox = None
+            return
+        y0, y1 = ys.min(), ys.max() + 1
+        x0, x1 = xs.min(), xs.max() + 1
+        self.bbox = (y0, y1, x0, x1)
+        self.mask = mask[y0:y1, x0:x1, None].astype(bool)
+        self.color = color[y0:y1, x0:x1].copy()
+
+    def apply(self, image_bgr):
+        """以單次遮罩複製將圖層套用到影像（就地修改）"""
+        if self.bbox is None:
+            return image_bgr
+        y0, y1, x0, x1 = self.bbox
+        np.copyto(image_bgr[y0:y1, x0:x1], self.color, where=self.mask)
+        return image_bgr
+
+
+class OverlayCache:
+    """
+    依攝影機快取標籤多邊形圖層。
+    label_path 或 cell 尺寸改變時自動重建；標籤顯示設定改變時呼叫 invalidate()。
+    """
+
+    def __init__(self, thickness=2):
+        self.thickness = thickness  # 多邊形線寬
+        self._layers = {}  # cam_id -> ((label_path, w, h), OverlayLayer)
+
+    def invalidate(self, cam_id=None):
+        """清除單一攝影機或全部的快取圖層"""
+        if cam_id is None:
+            self._layers.clear()
+        else:
+            self._layers.pop(cam_id, None)
+
+    def get_layer(self, cam_id, label_path, width, height, style):
+        """
+        取得攝影機的圖層，必要時重建。
+        style 為 {label_type: (visible, color)}。
+        """
+        key = (label_path, width, height)
+        cached = self._layers.get(cam_id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        layer = self.build_layer(label_path, width, height, style)
+        self._layers[cam_id] = (key, layer)
+        return layer
+
+    def build_layer(self, label_path, width, height, style):
+        """將所有可見的標籤多邊形繪製成圖層"""
+        mask = np.zeros((height, width), dtype=np.uint8)
+        color = np.zeros((height, width, 3), dtype=np.uint8)
+        try:
+            polygons = load_label_polygons(label_path)
+        except FileNotFoundError as e:
+            print(f"build_layer error: {e}")
+            polygons = []
+        except Exception as e:
+            print(f"build_layer unexpected error: {e}")
+            polygons = []
+
+        for label_type, pts_norm in polygons:
+            visible, label_color = style[label_type]
+            if not visible:
+                continue  # 如果不可見則跳過繪製
+            polygon = [(int(nx * width), int(ny * height)) for nx, ny in pts_norm]
+            poly_np = np.array([polygon], dtype=np.int32)
+            cv2.polylines(color, poly_np, True, label_color, self.thickness)
+            cv2.polylines(mask, poly_np, True, 255, self.thickness)
+        return OverlayLayer(mask, color)
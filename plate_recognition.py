@@ -0,0 +1,208 @@
+import threading
+import time
+import cv2
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+"""
+車牌辨識線程類別
+第二階段辨識流程：從車輛檢測框或標籤中的 plate 區域，以原始解析度裁切影像，
+將所有攝影機的裁切影像合併成批次交給車牌辨識模型。
+結果依追蹤 ID 或區域快取，畫面內容未明顯改變時不重複辨識。
+"""
+
+
+def iou(a, b):
+    """計算兩個 (x1, y1, x2, y2) 框的 IoU"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def crop_signature(crop):
+    """縮小為灰階小圖，用來判斷區域內容是否改變"""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (32, 12), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def decode_plate(result, names):
+    """
+    將辨識模型的結果轉為 (text, conf)。
+    分類模型取最高分類別；字元檢測模型依 x 座標由左到右串接字元。
+    """
+    probs = getattr(result, "probs", None)
+    if probs is not None:
+        return str(names[int(probs.top1)]), float(probs.top1conf)
+    if result.boxes is None or len(result.boxes) == 0:
+        return "", 0.0
+    data = result.boxes.data.cpu().numpy()
+    order = np.argsort(data[:, 0])
+    text = "".join(str(names[int(cls_id)]) for cls_id in data[order, 5])
+    return text, float(data[:, 4].mean())
+
+
+class PlateRecognitionThread(QThread):
+    plates_ready = pyqtSignal(object, int)  # ({key: result}, cam_id)
+
+    def __init__(
+        self,
+        batch_size=16,
+        min_interval=0.5,
+        cache_ttl=10.0,
+        change_threshold=12.0,
+        track_iou=0.3,
+        padding=0.05,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.batch_size = batch_size  # 每批最多裁切影像數
+        self.min_interval = min_interval  # 每台攝影機的最短送出間隔（秒）
+        self.cache_ttl = cache_ttl  # 快取結果的有效時間（秒）
+        self.change_threshold = change_threshold  # 灰階平均差超過此值視為內容改變
+        self.track_iou = track_iou  # 車輛框對應到既有追蹤 ID 的 IoU 門檻
+        self.padding = padding  # 裁切時向外擴張的比例
+        self.model = None
+        self._cond = threading.Condition()
+        self._pending = {}  # (cam_id, key) -> (crop, signature, box)
+        self._cache = {}  # (cam_id, key) -> {"text", "conf", "box", "ts", "signature"}
+        self._tracks = {}  # cam_id -> {track_id: box}
+        self._next_track = 0
+        self._last_submit = {}  # (cam_id, 來源) -> 上次送出時間
+        self._running = True
+
+    def set_model(self, model):
+        """設定或清除車牌辨識模型"""
+        with self._cond:
+            self.model = model
+            self._pending.clear()
+            self._cache.clear()
+
+    def assign_tracks(self, cam_id, boxes):
+        """以 IoU 將車輛框對應到既有追蹤 ID，回傳 [("track", id), ...]（需持有鎖）"""
+        previous = self._tracks.get(cam_id, {})
+        current = {}
+        keys = []
+        for box in boxes:
+            best_id, best_iou = None, self.track_iou
+            for track_id, prev_box in previous.items():
+                score = iou(box, prev_box)
+                if track_id not in current and score >= best_iou:
+                    best_id, best_iou = track_id, score
+            if best_id is None:
+                best_id = self._next_track
+                self._next_track += 1
+            current[best_id] = box
+            keys.append(("track", best_id))
+        self._tracks[cam_id] = current
+        return keys
+
+    def submit(self, cam_id, frame, car_boxes=None, plate_regions=()):
+        """
+        送出一張影格的待辨識區域（正規化座標）。
+        car_boxes 為此影格的車輛檢測框，須與 frame 為同一張影格（由檢測線程送出）；
+        None 表示未附檢測結果，不更新追蹤。
+        plate_regions 為 [(key, box), ...] 的固定車牌區域。
+        快取仍有效且內容未改變的區域不會重新辨識。
+        """
+        now = time.time()
+        # 車輛框與固定區域分別節流，兩條送出路徑互不影響
+        source = (cam_id, car_boxes is not None)
+        with self._cond:
+            if self.model is None:
+                return
+            if now - self._last_submit.get(source, 0.0) < self.min_interval:
+                return
+            self._last_submit[source] = now
+            regions = list(plate_regions)
+            if car_boxes is not None:
+                regions += zip(self.assign_tracks(cam_id, car_boxes), car_boxes)
+            self._expire(now)
+
+            for key, box in regions:
+                crop = self.crop_region(frame, box)
+                if crop is None:
+                    continue
+                signature = crop_signature(crop)
+                cached = self._cache.get((cam_id, key))
+                if cached is not None:
+                    cached["box"] = box
+                    changed = np.abs(cached["signature"] - signature).mean()
+                    if changed < self.change_threshold:
+                        continue
+                self._pending[(cam_id, key)] = (crop, signature, box)
+            if self._pending:
+                self._cond.notify()
+
+    def crop_region(self, frame, box):
+        """以原始解析度裁切區域（複製，不引用原影格緩衝區）"""
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = box
+        pad_x, pad_y = (x2 - x1) * self.padding, (y2 - y1) * self.padding
+        x1, x2 = int(max(0.0, x1 - pad_x) * w), int(min(1.0, x2 + pad_x) * w)
+        y1, y2 = int(max(0.0, y1 - pad_y) * h), int(min(1.0, y2 + pad_y) * h)
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None
+        return frame[y1:y2, x1:x2].copy()
+
+    def _expire(self, now):
+        """移除過期的快取（需持有鎖）"""
+        expired = [k for k, v in self._cache.items() if now - v["ts"] > self.cache_ttl]
+        for key in expired:
+            del self._cache[key]
+
+    def cached_results(self, cam_id):
+        """回傳攝影機目前快取的辨識結果 {key: result}"""
+        with self._cond:
+            return {
+                key: dict(value)
+                for (cid, key), value in self._cache.items()
+                if cid == cam_id
+            }
+
+    def run(self):
+        """執行線程，將各攝影機的裁切影像合併成批次辨識。"""
+        while self._running:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait(0.5)
+                if not self._running:
+                    break
+                items = list(self._pending.items())[: self.batch_size]
+                for item_key, _ in items:
+                    del self._pending[item_key]
+                model = self.model
+            if model is None:
+                continue
+
+            crops = [crop for _, (crop, _, _) in items]
+            try:
+                results = model(crops, verbose=False)
+            except Exception as e:
+                print(f"Plate recognition error: {e}")
+                continue
+
+            now = time.time()
+            updated = {}
+            with self._cond:
+                for (item_key, (_, signature, box)), result in zip(items, results):
+                    text, conf = decode_plate(result, model.names)
+                    entry = {
+                        "text": text,
+                        "conf": conf,
+                        "box": box,
+                        "ts": now,
+                        "signature": signature,
+                    }
+                    self._cache[item_key] = entry
+                    updated.setdefault(item_key[0], {})[item_key[1]] = entry
+            for cam_id in updated:
+                self.plates_ready.emit(self.cached_results(cam_id), cam_id)
+
+    def stop(self):
+        """停止車牌辨識線程。"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self.wait()
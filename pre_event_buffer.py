@@ -0,0 +1,223 @@
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from collections import deque
+from PyQt5.QtCore import QThread, pyqtSignal
+
+"""
+事件前緩衝區模組
+PreEventBuffer 在記憶體預算內以 JPEG 壓縮保存每台攝影機最近的影格，
+觸發時（停車觸發或手動熱鍵）將事件前 (pre-roll) 與事件後 (post-roll)
+的影格交給 ClipWriterThread 在背景線程寫成影片檔。
+"""
+
+
+class PreEventBuffer:
+    """
+    單一攝影機的事件前環形緩衝區。
+
+    push() 由擷取線程呼叫，trigger() 由主線程呼叫，兩者以鎖保護。
+    緩衝區同時受時間長度 (pre_seconds) 與記憶體上限 (max_bytes) 限制，
+    因此長時間運行時記憶體用量維持固定。
+    """
+
+    def __init__(
+        self,
+        camera_id,
+        pre_seconds=10.0,
+        post_seconds=5.0,
+        max_bytes=16 * 1024 * 1024,
+        max_width=960,
+        jpeg_quality=70,
+        record_fps=10.0,
+        max_clip_seconds=60.0,
+        on_clip_ready=None,
+    ):
+        self.camera_id = camera_id
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_bytes = max_bytes
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self.record_fps = record_fps
+        self.max_clip_seconds = max_clip_seconds
+        self.on_clip_ready = on_clip_ready  # 片段完成時的回呼 (clip dict)
+
+        self._lock = threading.Lock()
+        self._ring = deque()  # [(timestamp, jpeg_bytes), ...]
+        self._ring_bytes = 0
+        self._pending = None  # 尚在收集 post-roll 的片段
+        self._last_push = 0.0
+
+    def due(self, now=None):
+        """依 record_fps 判斷下一張影格是否會被收錄（不改變狀態）。"""
+        now = time.time() if now is None else now
+        return not self.record_fps or now - self._last_push >= 1.0 / self.record_fps
+
+    def push(self, frame):
+        """加入一張影格（依 record_fps 節流），並推進未完成的片段。"""
+        now = time.time()
+        if not self.due(now):
+            return
+        self._last_push = now
+
+        data = self.encode_frame(frame)
+        if data is None:
+            return
+
+        finished = None
+        with self._lock:
+            self._ring.append((now, data))
+            self._ring_bytes += len(data)
+            self._evict(now)
+
+            if self._pending is not None:
+                self._pending["frames"].append((now, data))
+                if now >= self._pending["end_ts"]:
+                    finished = self._pending
+                    self._pending = None
+
+        if finished is not None:
+            self._emit_clip(finished)
+
+    def encode_frame(self, frame):
+        """縮小並以 JPEG 壓縮影格，回傳 bytes。"""
+        h, w = frame.shape[:2]
+        if self.max_width and w > self.max_width:
+            scale = self.max_width / w
+            frame = cv2.resize(
+                frame, (self.max_width, int(h * scale)), interpolation=cv2.INTER_AREA
+            )
+        ok, buf = cv2.imencode(
+            ".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        )
+        if not ok:
+            return None
+        return buf.tobytes()
+
+    def _evict(self, now):
+        """移除超過時間長度或記憶體上限的舊影格（需持有鎖）。"""
+        while self._ring and (
+            self._ring[0][0] < now - self.pre_seconds
+            or self._ring_bytes > self.max_bytes
+        ):
+            _, old = self._ring.popleft()
+            self._ring_bytes -= len(old)
+
+    def trigger(self, reason="manual"):
+        """
+        觸發錄影。若已有片段在收集 post-roll，則延長其結束時間，
+        但總長度不超過 max_clip_seconds。
+        """
+        now = time.time()
+        with self._lock:
+            if self._pending is not None:
+                limit = self._pending["start_ts"] + self.max_clip_seconds
+                self._pending["end_ts"] = min(now + self.post_seconds, limit)
+                return
+            frames = list(self._ring)
+            self._pending = {
+                "camera_id": self.camera_id,
+                "reason": reason,
+                "trigger_ts": now,
+                "start_ts": frames[0][0] if frames else now,
+                "end_ts": now + self.post_seconds,
+                "fps": self.record_fps,
+                "frames": frames,
+            }
+
+    def flush(self):
+        """立即結束未完成的片段（例如串流停止時）。"""
+        with self._lock:
+            finished = self._pending
+            self._pending = None
+        if finished is not None:
+            self._emit_clip(finished)
+
+    def memory_usage(self):
+        """回傳環形緩衝區目前佔用的位元組數。"""
+        with self._lock:
+            return self._ring_bytes
+
+    def _emit_clip(self, clip):
+        if not clip["frames"]:
+            return
+        if self.on_clip_ready is not None:
+            self.on_clip_ready(clip)
+
+
+class ClipWriterThread(QThread):
+    """在背景線程中將片段的 JPEG 影格解碼並寫成影片檔。"""
+
+    clip_saved = pyqtSignal(str, int)  # (file_path, cam_id)
+    error_signal = pyqtSignal(str, int)  # (error_msg, cam_id)
+
+    def __init__(self, output_dir="clips", max_pending=8, parent=None):
+        super().__init__(parent)
+        self.output_dir = output_dir  # 影片輸出目錄
+        self._queue = queue.Queue(maxsize=max_pending)  # 限制待寫入片段數量
+        self._running = True
+
+    def submit(self, clip):
+        """加入待寫入的片段；佇列已滿時丟棄並回傳 False。"""
+        try:
+            self._queue.put_nowait(clip)
+            return True
+        except queue.Full:
+            self.error_signal.emit("錄影佇列已滿，捨棄片段", clip["camera_id"])
+            return False
+
+    def run(self):
+        """執行線程，依序寫入佇列中的片段。"""
+        while self._running or not self._queue.empty():
+            try:
+                clip = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                path = self.write_clip(clip)
+                self.clip_saved.emit(path, clip["camera_id"])
+            except Exception as e:
+                self.error_signal.emit(f"寫入片段失敗: {e}", clip["camera_id"])
+
+    def write_clip(self, clip):
+        """將片段寫成 mp4 檔並回傳檔案路徑。"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        frames = clip["frames"]
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(clip["trigger_ts"]))
+        file_name = f"cam{clip['camera_id']}_{stamp}_{clip['reason']}.mp4"
+        path = os.path.join(self.output_dir, file_name)
+
+        # 以實際時間戳估算幀率，避免節流後播放速度不正確
+        duration = frames[-1][0] - frames[0][0]
+        if len(frames) > 1 and duration > 0:
+            fps = (len(frames) - 1) / duration
+        else:
+            fps = clip.get("fps") or 10.0
+
+        writer = None
+        size = None
+        try:
+            for _, data in frames:
+                image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    continue
+                if writer is None:
+                    size = (image.shape[1], image.shape[0])
+                    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+                    writer = cv2.VideoWriter(path, fourcc, fps, size)
+                elif (image.shape[1], image.shape[0]) != size:
+                    image = cv2.resize(image, size)  # 串流中途改變解析度
+                writer.write(image)
+        finally:
+            if writer is not None:
+                writer.release()
+        return path
+
+    def stop(self):
+        """停止線程，寫完佇列中剩餘的片段後結束。"""
+        self._running = False
+        self.wait()
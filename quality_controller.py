@@ -0,0 +1,200 @@
+import threading
+import time
+from PyQt5.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal
+
+"""
+品質控制器類別
+此類別監看拼接合成的負載、顯示延遲（擷取到畫面合成）、因背壓略過的影格
+與檢測積壓，在負載過高時逐級降低畫質成本，負載回落後再逐級恢復。
+升降級使用不同門檻與連續取樣次數（遲滯），避免在兩個等級間來回震盪。
+取樣在獨立線程的計時器中執行，主線程事件迴圈忙碌時仍能降級。
+"""
+
+# 依序降級的品質等級，後一級包含前一級的調整
+QUALITY_LEVELS = [
+    {
+        "name": "完整畫質",
+        "resolution": None,  # None 表示使用者選擇的解析度
+        "fast_scaling": False,  # 使用最近鄰縮放
+        "capture_fps": None,  # None 表示不限制擷取幀率
+        "detection_interval": 0.0,
+    },
+    {
+        "name": "720p 合成",
+        "resolution": "720p",
+        "fast_scaling": False,
+        "capture_fps": None,
+        "detection_interval": 0.0,
+    },
+    {
+        "name": "快速縮放",
+        "resolution": "720p",
+        "fast_scaling": True,
+        "capture_fps": None,
+        "detection_interval": 0.0,
+    },
+    {
+        "name": "降低擷取幀率",
+        "resolution": "720p",
+        "fast_scaling": True,
+        "capture_fps": 12,
+        "detection_interval": 0.0,
+    },
+    {
+        "name": "降低檢測頻率",
+        "resolution": "720p",
+        "fast_scaling": True,
+        "capture_fps": 12,
+        "detection_interval": 1.0,
+    },
+    {
+        "name": "最低畫質",
+        "resolution": "720p",
+        "fast_scaling": True,
+        "capture_fps": 6,
+        "detection_interval": 2.0,
+    },
+]
+
+
+class QualityController(QObject):
+    level_changed = pyqtSignal(int, dict)  # (level, settings)
+
+    def __init__(
+        self,
+        backlog_source=None,
+        sample_interval_ms=1000,
+        high_load=0.75,
+        low_load=0.4,
+        high_backlog=1.0,
+        low_backlog=0.3,
+        drop_source=None,
+        high_lag=0.5,
+        low_lag=0.2,
+        high_drop_rate=1.0,
+        degrade_after=2,
+        restore_after=5,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.backlog_source = backlog_source  # 回傳 (數量, 等待秒數) 的函式
+        self.high_load = high_load  # 合成忙碌比例超過此值視為過載
+        self.low_load = low_load  # 合成忙碌比例低於此值視為有餘裕
+        self.high_backlog = high_backlog  # 檢測積壓秒數超過此值視為過載
+        self.low_backlog = low_backlog  # 檢測積壓秒數低於此值視為有餘裕
+        self.drop_source = drop_source  # 回傳累計略過影格數的函式（可跨線程呼叫）
+        self.high_lag = high_lag  # 顯示延遲秒數超過此值視為過載
+        self.low_lag = low_lag  # 顯示延遲秒數低於此值視為有餘裕
+        self.high_drop_rate = high_drop_rate  # 每秒略過影格數超過此值視為過載
+        self.degrade_after = degrade_after  # 連續過載幾次後降級
+        self.restore_after = restore_after  # 連續有餘裕幾次後升級
+
+        self.level = 0
+        self.load = 0.0  # 最近一次取樣的合成忙碌比例
+        self.backlog_age = 0.0  # 最近一次取樣的檢測積壓秒數
+        self.display_lag = 0.0  # 最近一次取樣的最大顯示延遲（秒）
+        self.drop_rate = 0.0  # 最近一次取樣的每秒略過影格數
+        self._lock = threading.Lock()  # 保護主線程累積、取樣線程讀取的數值
+        self._busy = 0.0  # 取樣區間內累積的合成耗時
+        self._max_lag = 0.0  # 取樣區間內的最大顯示延遲
+        self._dropped = 0  # 上次取樣時的累計略過影格數
+        self._window_start = time.perf_counter()
+        self._pressure_count = 0
+        self._headroom_count = 0
+
+        # 計時器移至取樣線程，sample() 不受主線程事件佇列影響
+        self._sampler = QThread(self)
+        self.timer = QTimer()
+        self.timer.setInterval(sample_interval_ms)
+        self.timer.moveToThread(self._sampler)
+        self.timer.timeout.connect(self.sample, Qt.DirectConnection)
+        self._sampler.started.connect(self.timer.start)
+        self._sampler.finished.connect(self.timer.stop, Qt.DirectConnection)
+        self._sampler.start()
+
+    @property
+    def settings(self):
+        """目前等級的品質設定"""
+        return QUALITY_LEVELS[self.level]
+
+    def record_composite(self, seconds):
+        """記錄一次拼接合成的耗時"""
+        with self._lock:
+            self._busy += seconds
+
+    def record_lag(self, seconds):
+        """記錄一次顯示延遲：最舊的待顯示影格從擷取到合成完成的秒數"""
+        with self._lock:
+            self._max_lag = max(self._max_lag, seconds)
+
+    def sample(self):
+        """定期取樣負載並決定是否調整等級（於取樣線程執行）"""
+        now = time.perf_counter()
+        elapsed = max(now - self._window_start, 1e-6)
+        with self._lock:
+            self.load = self._busy / elapsed
+            self.display_lag = self._max_lag
+            self._busy = 0.0
+            self._max_lag = 0.0
+        self._window_start = now
+        if self.backlog_source is not None:
+            _, self.backlog_age = self.backlog_source()
+        else:
+            self.backlog_age = 0.0
+        if self.drop_source is not None:
+            dropped = self.drop_source()
+            self.drop_rate = max(0, dropped - self._dropped) / elapsed
+            self._dropped = dropped
+        else:
+            self.drop_rate = 0.0
+
+        if (
+            self.load > self.high_load
+            or self.backlog_age > self.high_backlog
+            or self.display_lag > self.high_lag
+            or self.drop_rate > self.high_drop_rate
+        ):
+            self._pressure_count += 1
+            self._headroom_count = 0
+        elif (
+            self.load < self.low_load
+            and self.backlog_age < self.low_backlog
+            and self.display_lag < self.low_lag
+            and self.drop_rate == 0
+        ):
+            self._headroom_count += 1
+            self._pressure_count = 0
+        else:
+            # 介於兩門檻之間：維持目前等級
+            self._pressure_count = 0
+            self._headroom_count = 0
+
+        if (
+            self._pressure_count >= self.degrade_after
+            and self.level < len(QUALITY_LEVELS) - 1
+        ):
+            self.set_level(self.level + 1)
+        elif self._headroom_count >= self.restore_after and self.level > 0:
+            self.set_level(self.level - 1)
+
+    def set_level(self, level):
+        """切換品質等級並記錄轉換"""
+        level = max(0, min(level, len(QUALITY_LEVELS) - 1))
+        if level == self.level:
+            return
+        old = self.level
+        self.level = level
+        self._pressure_count = 0
+        self._headroom_count = 0
+        print(
+            f"品質調整: {QUALITY_LEVELS[old]['name']} -> "
+            f"{QUALITY_LEVELS[level]['name']} "
+            f"(合成負載 {self.load:.0%}, 顯示延遲 {self.display_lag:.2f}s, "
+            f"略過 {self.drop_rate:.1f} fps, 檢測積壓 {self.backlog_age:.2f}s)"
+        )
+        self.level_changed.emit(level, dict(self.settings))
+
+    def stop(self):
+        """停止取樣線程"""
+        self._sampler.quit()
+        self._sampler.wait()
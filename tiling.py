@@ -0,0 +1,76 @@
+import numpy as np
+
+"""
+切片推論工具模組
+將高解析度影格切成互相重疊的切片，讓小物件（車牌、遠方車輛）
+在縮放到模型輸入尺寸後仍保有足夠像素；各切片的檢測框再以跨切片的框合併（NMM）去除重複。
+此模組不依賴 Qt。
+"""
+
+
+def _starts(length, tile, stride):
+    """沿單一軸計算切片起點，最後一片貼齊邊界"""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def tile_windows(width, height, tile_size=640, overlap=0.2):
+    """回傳覆蓋整張影格的切片 [(x0, y0, x1, y1), ...]"""
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+    return [
+        (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+        for y0 in _starts(height, tile_size, stride)
+        for x0 in _starts(width, tile_size, stride)
+    ]
+
+
+def filter_windows(windows, width, height, regions):
+    """只保留與任一區域（正規化外接框）相交的切片"""
+    kept = []
+    for x0, y0, x1, y1 in windows:
+        for rx1, ry1, rx2, ry2 in regions:
+            if (
+                x0 < rx2 * width
+                and x1 > rx1 * width
+                and y0 < ry2 * height
+                and y1 > ry1 * height
+            ):
+                kept.append((x0, y0, x1, y1))
+                break
+    return kept
+
+
+def merge_boxes(dets, threshold=0.5):
+    """
+    依類別合併跨切片的重複檢測（greedy NMM）。dets 形狀為 [N,6]：(x1, y1, x2, y2, conf, cls)。
+    重疊以「交集 / 較小框面積」（IoS）衡量：切片邊緣截斷的框只含物件的一小部分，
+    與完整框的 IoU 很低，但 IoS 接近 1。由信心度最高的框開始，吸收 IoS 超過門檻的
+    同類別框並擴張為兩者的外接框，回傳合併後的檢測結果（依信心度由高到低）。
+    """
+    if len(dets) == 0:
+        return dets
+    # 依類別平移座標，使不同類別的框互不重疊
+    offsets = dets[:, 5:6] * (dets[:, :4].max() + 1.0)
+    boxes = dets[:, :4] + offsets
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-dets[:, 4])
+    merged = []
+    while len(order) > 0:
+        i = order[0]
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.maximum(0.0, xx2 - xx1) * np.maximum(0.0, yy2 - yy1)
+        overlap = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        group = np.concatenate(([i], rest[overlap > threshold]))
+        det = dets[i].copy()
+        det[:2] = dets[group, :2].min(axis=0)
+        det[2:4] = dets[group, 2:4].max(axis=0)
+        merged.append(det)
+        order = rest[overlap <= threshold]
+    return np.stack(merged)
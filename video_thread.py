@@ -1,45 +1,149 @@
 import cv2
+import time
 import numpy as np
 from PyQt5.QtCore import QThread, pyqtSignal
+from frame_pool import FramePool
 
 """
 視頻線程類別
 此類別負責從攝影機或視頻源捕獲影像，並在獨立線程中處理影像數據。
 它會發送捕獲的影像幀和錯誤信息到主界面。
+影格解碼到 FramePool 的緩衝區，接收端使用完畢後須呼叫 frame_pool.release()。
+緩衝池已滿（接收端跟不上）時略過發送，只供事件前緩衝區的影格解碼到線程自有的暫存陣列。
+max_fps 只限制 retrieve（色彩轉換與複製）與發送：FFmpeg 後端的解碼在 grab() 中進行，
+未發送的幀仍會完整解碼，降低解碼成本須改用較低幀率或子碼流的來源。
+fake:// 來源改由 fake_camera.FakeCapture 產生畫面，用於負載與故障注入測試。
 """
 
 
+def open_capture(url):
+    """依 URL 開啟視頻來源，fake:// 使用模擬攝影機"""
+    if url.startswith("fake://"):
+        from fake_camera import FakeCapture
+
+        return FakeCapture(url)
+    return cv2.VideoCapture(url)
+
+
 class VideoThread(QThread):
-    frame_signal = pyqtSignal(np.ndarray, int)  # (frame, cam_id)
+    frame_signal = pyqtSignal(np.ndarray, int, float)  # (frame, cam_id, 擷取時間)
     error_signal = pyqtSignal(str, int)  # (error_msg, cam_id)
 
-    def __init__(self, rtsp_url, camera_id, parent=None):
+    def __init__(
+        self,
+        rtsp_url,
+        camera_id,
+        pre_event_buffer=None,
+        frame_pool=None,
+        parent=None,
+    ):
         super().__init__(parent)
         self.rtsp_url = rtsp_url  # RTSP 來源 URL
         self.camera_id = camera_id  # 攝影機 ID
+        self.pre_event_buffer = pre_event_buffer  # 事件前緩衝區（可選）
+        self.frame_pool = frame_pool if frame_pool is not None else FramePool()
+        self.max_fps = None  # 發送幀率上限，None 表示不限制
+        self._last_emit = 0.0
+        self._scratch = None  # 只供錄影的影格所用的暫存陣列
         self._running = True  # 控制線程運行的標誌
+        self._cap = None  # 目前的視頻來源，停止時用來中斷阻塞的讀取
 
     def run(self):
         """執行線程，捕獲視頻幀。"""
+        connected = False  # 曾成功連線過的來源，斷線後持續重試
         while self._running:
-            cap = cv2.VideoCapture(self.rtsp_url)  # 嘗試打開視頻來源
+            cap = open_capture(self.rtsp_url)  # 嘗試打開視頻來源
+            self._cap = cap
             if not cap.isOpened():
-                self.error_signal.emit(f"無法開啟來源：{self.rtsp_url}", self.camera_id)
-                return
+                if not connected:
+                    self.error_signal.emit(
+                        f"無法開啟來源：{self.rtsp_url}", self.camera_id
+                    )
+                    return
+                cap.release()
+                self.interruptible_sleep(2)  # 來源尚未恢復，稍後再試
+                continue
+            connected = True
 
             while self._running:
-                ret, frame = cap.read()  # 讀取幀
+                ret = cap.grab()  # 讀取封包
+                grabbed_at = time.time()
+                emit = record = False
+                if ret:
+                    # 事件前緩衝區依自己的 record_fps 收錄，不受發送幀率上限影響
+                    emit = self.frame_due() and self.frame_pool.available()
+                    record = (
+                        self.pre_event_buffer is not None
+                        and self.pre_event_buffer.due()
+                    )
+                    if not emit and not record:
+                        continue  # 未達發送或收錄時間，略過 retrieve（grab 已解碼）
+                    if emit:
+                        ret, frame = self.decode_frame(cap)  # 解碼幀
+                    else:
+                        ret, frame = self.decode_scratch(cap)
+                if not ret and not self._running:
+                    break  # 停止時中斷的讀取，不視為錯誤
                 if not ret:
                     self.error_signal.emit(
                         "讀取畫面失敗，嘗試重新連接...", self.camera_id
                     )
                     cap.release()  # 釋放資源
-                    QThread.sleep(2)  # 暫停2秒後重新連接
+                    self.interruptible_sleep(2)  # 暫停2秒後重新連接
                     break
-                self.frame_signal.emit(frame, self.camera_id)  # 發送捕獲的幀
+                if record:
+                    self.pre_event_buffer.push(frame)  # 在擷取線程中壓縮保存
+                if emit:
+                    self._last_emit = grabbed_at
+                    # 發送捕獲的幀與擷取時間（檢測紀錄以此為準）
+                    self.frame_signal.emit(frame, self.camera_id, grabbed_at)
         cap.release()  # 確保釋放資源
 
+    def decode_frame(self, cap):
+        """將已抓取的幀解碼到緩衝池中的既有陣列。"""
+        buf = self.frame_pool.acquire()
+        if buf is not None:
+            ret, frame = cap.retrieve(buf)
+        else:
+            ret, frame = cap.retrieve()
+        if not ret or frame is None:
+            if buf is not None:
+                self.frame_pool.release(buf)
+            return False, None
+        return True, self.frame_pool.track(frame, buf)
+
+    def decode_scratch(self, cap):
+        """只供事件前緩衝區的幀解碼到重複使用的暫存陣列，不佔用緩衝池。"""
+        if self._scratch is not None:
+            ret, frame = cap.retrieve(self._scratch)
+        else:
+            ret, frame = cap.retrieve()
+        if not ret or frame is None:
+            return False, None
+        self._scratch = frame
+        return True, frame
+
+    def frame_due(self):
+        """依 max_fps 判斷是否該發送下一幀（發送後才更新時間）。"""
+        if not self.max_fps:
+            return True
+        return time.time() - self._last_emit >= 1.0 / self.max_fps
+
+    def interruptible_sleep(self, seconds):
+        """分段休眠，停止時可立即返回。"""
+        for _ in range(int(seconds * 10)):
+            if not self._running:
+                return
+            QThread.msleep(100)
+
+    def request_stop(self):
+        """要求線程停止但不等待，讓多個線程可同時關閉。"""
+        self._running = False  # 設置運行標誌為 False
+        interrupt = getattr(self._cap, "interrupt", None)
+        if interrupt is not None:
+            interrupt()  # 模擬攝影機停滯時 grab() 會阻塞
+
     def stop(self):
         """停止視頻捕獲線程。"""
-        self._running = False  # 設置運行標誌為 False
+        self.request_stop()
         self.wait()  # 等待線程結束
@@ -6,6 +6,7 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QFileDialog,
     QHBoxLayout,
+    QLineEdit,
 )
 from PyQt5.QtCore import pyqtSignal
 
@@ -62,6 +63,33 @@ class YoloSettingsDialog(QDialog):
         self.mode_combo.setCurrentText(current_mode)
         form_layout.addRow("檢測方式:", self.mode_combo)
 
+        # 切片推論：高解析度影格切成重疊切片，提高小物件的檢出率
+        self.tiled_checkbox = QCheckBox("啟用切片推論")
+        self.tiled_checkbox.setChecked(self.detection_settings.get("tiled", False))
+        self.tile_roi_checkbox = QCheckBox("只處理與標籤區域相交的切片")
+        self.tile_roi_checkbox.setChecked(
+            self.detection_settings.get("tile_roi_only", False)
+        )
+        form_layout.addRow("切片推論:", self.tiled_checkbox)
+        form_layout.addRow("", self.tile_roi_checkbox)
+
+        # 車牌辨識（第二階段）：啟用勾選框與模型路徑
+        self.plate_checkbox = QCheckBox("啟用車牌辨識")
+        self.plate_checkbox.setChecked(
+            self.detection_settings.get("plate_enabled", False)
+        )
+        form_layout.addRow("車牌辨識:", self.plate_checkbox)
+
+        self.plate_model_edit = QLineEdit(
+            self.detection_settings.get("plate_model", "")
+        )
+        choose_plate_btn = QPushButton("選擇模型")
+        choose_plate_btn.clicked.connect(self.choose_plate_model_file)
+        hbox_plate = QHBoxLayout()
+        hbox_plate.addWidget(self.plate_model_edit)
+        hbox_plate.addWidget(choose_plate_btn)
+        form_layout.addRow("車牌模型:", hbox_plate)
+
         # 操作按鈕
         btn_layout = QHBoxLayout()
         save_btn = QPushButton("儲存")
@@ -86,9 +114,23 @@ class YoloSettingsDialog(QDialog):
                 self.model_combo.addItem(file_path)
             self.model_combo.setCurrentText(file_path)
 
+    def choose_plate_model_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "選擇車牌辨識模型檔案",
+            "",
+            "PyTorch Model Files (*.pt);;All Files (*)",
+        )
+        if file_path:
+            self.plate_model_edit.setText(file_path)
+
     def on_save(self):
         self.detection_settings["enabled"] = self.enable_checkbox.isChecked()
         self.detection_settings["model"] = self.model_combo.currentText()
         self.detection_settings["mode"] = self.mode_combo.currentText()
+        self.detection_settings["tiled"] = self.tiled_checkbox.isChecked()
+        self.detection_settings["tile_roi_only"] = self.tile_roi_checkbox.isChecked()
+        self.detection_settings["plate_enabled"] = self.plate_checkbox.isChecked()
+        self.detection_settings["plate_model"] = self.plate_model_edit.text().strip()
         self.detection_settings_changed.emit(self.detection_settings)
         self.accept()